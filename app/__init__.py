@@ -5,9 +5,9 @@ from flask import Flask
 
 from app import routes
 # Third-party imports
-from app.Database import db, create_facility_tables, create_employee_tables, create_employee_sublcass_tables, \
-    create_insurance_tables, create_treats_tables, create_patient_table, create_appointments_tables, \
-    create_invoice_tables, total_cost_trigger
+from app.Database import db
+from app.commands import register_commands
+from app.migrations import run_migrations
 from flask_bootstrap import Bootstrap5
 
 from app.utils.common import setup_logging
@@ -21,19 +21,12 @@ def create_app():
     app = Flask(__name__)
     app.config['SECRET_KEY'] = 'your_really_secret_key_here'
     db_manager.connect()
-    session = db.get_db()
-
-    create_facility_tables(session)
-    create_employee_tables(session)
-    create_employee_sublcass_tables(session)
-    create_insurance_tables(session)
-    create_patient_table(session)
-    create_treats_tables(session)
-    create_appointments_tables(session)
-    create_invoice_tables(session)
+    # One version check when the schema is current; pending migrations otherwise
+    run_migrations(db_manager.get_engine())
     app.config["SESSION_PERMANENT"] = False
     app.config["SESSION_TYPE"] = "filesystem"
     bootstrap = Bootstrap5(app)
     app.register_blueprint(routes.bp)
+    register_commands(app)
 
     return app
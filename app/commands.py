@@ -0,0 +1,162 @@
+import csv
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+import click
+
+from app.Database import db
+from crud_helpers.appointment_crud import create_appointments_bulk
+from crud_helpers.bulk_import import read_csv_batches, import_csv, IMPORTERS
+from crud_helpers.daily_revenue import rebuild_daily_revenue
+from crud_helpers.invoice_totals import flush_invoice_totals, reconcile_invoice_totals
+
+
+def parse_appointment_row(row):
+    return {
+        'patient_id': int(row['patient_id']),
+        'facility_id': int(row['facility_id']),
+        'doctor_id': int(row['doctor_id']),
+        'date_time': datetime.fromisoformat(row['date_time']),
+        'description': row.get('description') or None,
+    }
+
+
+@click.command('import-appointments')
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=1000, show_default=True, help='Appointments per transaction.')
+def import_appointments_command(path, batch_size):
+    """
+    Import appointments from a CSV with columns patient_id, facility_id,
+    doctor_id, date_time (ISO 8601) and description.
+    """
+    session = db.get_db()
+    created_total, rejected_total = 0, 0
+    try:
+        for batch in read_csv_batches(path, batch_size):
+            created, rejected = create_appointments_bulk(session, [parse_appointment_row(row) for row in batch])
+            created_total += created
+            rejected_total += len(rejected)
+            for row, reason in rejected:
+                logging.warning(f"Skipped appointment {row}: {reason}")
+            click.echo(f"Imported {created_total} appointments ({rejected_total} skipped)")
+    finally:
+        db.remove()
+
+
+@click.command('import-csv')
+@click.argument('entity', type=click.Choice(sorted(IMPORTERS)))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--batch-size', default=500, show_default=True, help='Rows per transaction.')
+@click.option('--errors', 'error_path', default=None, help='Error report path (default: <path>.errors.csv).')
+def import_csv_command(entity, path, batch_size, error_path):
+    """
+    Bulk import employees, facilities, patients or insurers from a CSV whose
+    header matches the fields of the corresponding schema in app.schemas.
+    """
+    try:
+        imported, failed, error_path = import_csv(db.get_db(), entity, path, batch_size, error_path)
+    finally:
+        db.remove()
+    click.echo(f"Imported {imported} {entity}; {failed} rejected (see {error_path})")
+
+
+@click.command('rebuild-daily-revenue')
+@click.option('--start', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='First invoice date to rebuild (default: earliest invoice).')
+@click.option('--end', type=click.DateTime(formats=['%Y-%m-%d']), default=None,
+              help='Day after the last invoice date to rebuild (default: after the latest invoice).')
+def rebuild_daily_revenue_command(start, end):
+    """
+    Recompute the DailyRevenue summary from InvoiceDetails, one month per
+    transaction. Use after backfills or writes that bypass crud_helpers.
+    """
+    try:
+        written = rebuild_daily_revenue(db.get_db(), start.date() if start else None, end.date() if end else None)
+    finally:
+        db.remove()
+    click.echo(f"Rebuilt DailyRevenue: {written} summary rows")
+
+
+@click.command('flush-invoice-totals')
+@click.option('--batch-size', default=500, show_default=True, help='Queue rows per transaction.')
+@click.option('--interval', default=0.0, show_default=True,
+              help='Keep running, polling the queue every INTERVAL seconds when it is empty.')
+def flush_invoice_totals_command(batch_size, interval):
+    """
+    Recompute the Invoice totals queued by the deferred invoice_totals_mode.
+    """
+    flushed_total = 0
+    try:
+        while True:
+            flushed = flush_invoice_totals(db.get_db(), batch_size)
+            flushed_total += flushed
+            if flushed:
+                continue
+            if not interval:
+                break
+            time.sleep(interval)
+    finally:
+        db.remove()
+    click.echo(f"Flushed {flushed_total} invoice totals")
+
+
+def load_checkpoint(path):
+    if not os.path.exists(path):
+        return {'after_id': 0, 'drifted': 0}
+    with open(path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(path, checkpoint):
+    # Write then rename so an interrupted run never leaves a truncated checkpoint
+    with open(f"{path}.tmp", 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(f"{path}.tmp", path)
+
+
+@click.command('reconcile-invoice-totals')
+@click.option('--fix', is_flag=True, help='Correct drifted totals instead of only reporting them.')
+@click.option('--chunk-size', default=1000, show_default=True, help='Invoices per chunk (and per transaction).')
+@click.option('--checkpoint', 'checkpoint_path', default='reconcile_invoice_totals.json', show_default=True,
+              help='Progress file; an existing one resumes the run where it stopped.')
+@click.option('--report', 'report_path', default='invoice_total_drift.csv', show_default=True,
+              help='CSV the drifted invoices are appended to.')
+@click.option('--pause', default=0.0, show_default=True, help='Seconds to sleep between chunks to throttle the load.')
+def reconcile_invoice_totals_command(fix, chunk_size, checkpoint_path, report_path, pause):
+    """
+    Compare every Invoice.total_cost with the sum of its InvoiceDetails, in
+    primary-key chunks, and report (or with --fix, correct) the drift.
+    Delete the checkpoint file to start over.
+    """
+    checkpoint = load_checkpoint(checkpoint_path)
+    if checkpoint['after_id']:
+        click.echo(f"Resuming after invoice {checkpoint['after_id']}")
+    try:
+        with open(report_path, 'a', newline='') as report_file:
+            report = csv.writer(report_file)
+            if report_file.tell() == 0:
+                report.writerow(['invoice_id', 'stored_total', 'actual_total', 'fixed'])
+            for last_id, drift in reconcile_invoice_totals(db.get_db(), checkpoint['after_id'], chunk_size, fix):
+                report.writerows((invoice_id, stored, actual, fix) for invoice_id, stored, actual in drift)
+                report_file.flush()
+                checkpoint['drifted'] += len(drift)
+                checkpoint['after_id'] = last_id
+                save_checkpoint(checkpoint_path, checkpoint)
+                logging.info(f"Reconciled invoices up to {last_id}: {len(drift)} drifted")
+                if pause:
+                    time.sleep(pause)
+    finally:
+        db.remove()
+    click.echo(f"Reconciled through invoice {checkpoint['after_id']}: {checkpoint['drifted']} drifted total(s) "
+               f"{'fixed' if fix else 'reported'} in {report_path}")
+
+
+def register_commands(app):
+    app.cli.add_command(import_appointments_command)
+    app.cli.add_command(import_csv_command)
+    app.cli.add_command(rebuild_daily_revenue_command)
+    app.cli.add_command(flush_invoice_totals_command)
+    app.cli.add_command(reconcile_invoice_totals_command)
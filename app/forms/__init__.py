@@ -1,14 +1,20 @@
+from decimal import Decimal
+
+from flask import url_for
 from flask_wtf import FlaskForm
-from wtforms import StringField, DecimalField, SubmitField, SelectField, DateField
+from wtforms import Form, StringField, DecimalField, SubmitField, SelectField, DateField, HiddenField, FieldList, \
+    FormField
 from wtforms.fields.datetime import DateTimeField, DateTimeLocalField
 from wtforms.fields.numeric import IntegerField
 from wtforms.fields.simple import TextAreaField
+from wtforms.widgets import TextInput
 from wtforms.validators import DataRequired, Optional, NumberRange, Regexp, ValidationError
 from app.Database import db
 from crud_helpers.employee_crud import get_all_doctors
 from crud_helpers.facility_crud import retrieve_facilities
 from crud_helpers.insurance_crud import retrieve_insurance_companies
-from crud_helpers.patient_crud import get_all_patients
+from crud_helpers.patient_crud import patient_exists
+from crud_helpers.reference_cache import reference_cache, DOCTORS, FACILITIES, INSURANCE_COMPANIES
 
 
 class BaseEmployeeForm(FlaskForm):
@@ -24,7 +30,7 @@ class BaseEmployeeForm(FlaskForm):
     def __init__(self, *args, **kwargs):
         super(BaseEmployeeForm, self).__init__(*args, **kwargs)
 
-        facility_data = retrieve_facilities(db.get_db())
+        facility_data = reference_cache.get(FACILITIES, retrieve_facilities, db.get_db())
         self.facility_id.choices = [(data['facility_id'], f"{data['facility_id']} - {data['ftype']}") for data in
                                     facility_data]
 
@@ -50,6 +56,22 @@ class OtherHCPForm(BaseEmployeeForm):
     submit = SubmitField('Submit')
 
 
+class EmployeeFilterForm(FlaskForm):
+    job_class = SelectField('Job Class', validators=[Optional()],
+                            choices=[('', 'Any'), ('Doctor', 'Doctor'), ('Nurse', 'Nurse'), ('Admin', 'Admin'),
+                                     ('OtherHCP', 'Other HCP')])
+    facility_id = SelectField('Facility', coerce=int, validators=[Optional()], choices=[])
+    q = StringField('Name or SSN', validators=[Optional()])
+    submit = SubmitField('Filter')
+
+    def __init__(self, *args, **kwargs):
+        super(EmployeeFilterForm, self).__init__(*args, **kwargs)
+
+        facility_data = reference_cache.get(FACILITIES, retrieve_facilities, db.get_db())
+        self.facility_id.choices = [(0, 'Any')] + [(data['facility_id'], f"{data['facility_id']} - {data['ftype']}")
+                                                   for data in facility_data]
+
+
 class BaseFacilityForm(FlaskForm):
     address = StringField('Address', validators=[DataRequired()])
     size = IntegerField('Size', validators=[DataRequired()])
@@ -91,11 +113,11 @@ class PatientForm(FlaskForm):
         super(PatientForm, self).__init__(*args, **kwargs)
 
         # Fetch all doctors and populate the choices for primary_doc_id
-        doctor_data = get_all_doctors(db.get_db())
+        doctor_data = reference_cache.get(DOCTORS, get_all_doctors, db.get_db())
         self.primary_doc_id.choices = [(doc['EMPID'], f"{doc['fname']} {doc['lname']}") for doc in doctor_data]
 
         # Fetch all insurance companies and populate the choices for insurance_id
-        insurance_data = retrieve_insurance_companies(db.get_db())
+        insurance_data = reference_cache.get(INSURANCE_COMPANIES, retrieve_insurance_companies, db.get_db())
 
         self.insurance_id.choices = [(ins['insurance_id'], ins['name']) for ins in insurance_data]
 
@@ -119,13 +141,37 @@ class DateRangeForm(FlaskForm):
             raise ValidationError("End date must be after begin date.")
 
     submit = SubmitField('Calculate Average Revenue')
-class RevenueDaysForm(FlaskForm):
-    # Regex to validate the input format as YYYY-MM
-    monthyear =  DateField('Date', format='%Y-%m', validators=[DataRequired()])
-    submit = SubmitField('Submit')
+class TopRevenueDaysForm(FlaskForm):
+    begin_date = DateField('Begin Date', format='%Y-%m-%d', validators=[DataRequired()])
+    end_date = DateField('End Date', format='%Y-%m-%d', validators=[DataRequired()])
+    k = IntegerField('Number of Days', default=5, validators=[DataRequired(), NumberRange(min=1, max=100)])
+    group_by = SelectField('Breakdown', validators=[Optional()],
+                           choices=[('', 'All facilities and insurers'), ('facility', 'Per facility'),
+                                    ('insurer', 'Per insurer')])
+    submit = SubmitField('Top Revenue Days')
+
+    def validate_end_date(self, field):
+        if field.data < self.begin_date.data:
+            raise ValidationError("End date must be after begin date.")
+
+
+# Patient pickers are filled by static/typeahead.js from the patient search API instead of a full-list SelectField
+PATIENT_TYPEAHEAD = {'autocomplete': 'off', 'placeholder': 'Type a name or patient ID'}
+
+
+def set_patient_typeahead_url(field):
+    # Resolved per request, so the picker follows the search_patients_api route
+    field.render_kw = dict(field.render_kw or {}, **{'data-typeahead-url': url_for('routes.search_patients_api')})
+
+
+def validate_patient_exists(form, field):
+    if field.data and not patient_exists(db.get_db(), field.data):
+        raise ValidationError("Unknown patient.")
+
 
 class AppointmentForm(FlaskForm):
-    patient_id = SelectField('Patient', coerce=int, validators=[DataRequired()])
+    patient_id = IntegerField('Patient', widget=TextInput(), render_kw=PATIENT_TYPEAHEAD,
+                              validators=[DataRequired(), validate_patient_exists])
     facility_id = SelectField('Facility', coerce=int, validators=[DataRequired()])
     doctor_id = SelectField('Doctor', coerce=int, validators=[DataRequired()])
     date_time = DateTimeLocalField('Date and Time', format='%Y-%m-%dT%H:%M', validators=[DataRequired()])
@@ -134,21 +180,18 @@ class AppointmentForm(FlaskForm):
 
     def __init__(self, appointment=None, *args, **kwargs):
         super(AppointmentForm, self).__init__(*args, **kwargs)
+        set_patient_typeahead_url(self.patient_id)
 
-        db_session = db.get_db()  # Assumed function to get the database session
-
-        # Populate patient choices
-        patient_data = get_all_patients(db_session)
-        self.patient_id.choices = [(pat['patient_id'], f"{pat['fname']} {pat['lname']}") for pat in patient_data]
+        db_session = db.get_db()  # Request-scoped session shared with the view
 
         # Populate facility choices
 
-        facility_data = retrieve_facilities(db.get_db())
+        facility_data = reference_cache.get(FACILITIES, retrieve_facilities, db_session)
         self.facility_id.choices = [(data['facility_id'], f"{data['facility_id']} - {data['ftype']}") for data in
                                     facility_data]
 
         # Populate doctor choices
-        doctor_data = get_all_doctors(db_session)
+        doctor_data = reference_cache.get(DOCTORS, get_all_doctors, db_session)
         self.doctor_id.choices = [(doc['EMPID'], f"{doc['fname']} {doc['lname']}") for doc in doctor_data]
 
         # Set default values if an appointment object is provided
@@ -161,7 +204,8 @@ class AppointmentForm(FlaskForm):
 
 
 class SearchAppointmentsForm(FlaskForm):
-    patient_id = SelectField('Patient', coerce=int, validators=[Optional()], choices=[])
+    patient_id = IntegerField('Patient', widget=TextInput(), render_kw=PATIENT_TYPEAHEAD,
+                              validators=[Optional(), validate_patient_exists])
     doctor_id = SelectField('Doctor', coerce=int, validators=[Optional()], choices=[])
     facility_id = SelectField('Facility', coerce=int, validators=[Optional()], choices=[])
     start_date = DateTimeLocalField('Start Date', format='%Y-%m-%dT%H:%M', validators=[Optional()])
@@ -170,19 +214,16 @@ class SearchAppointmentsForm(FlaskForm):
 
     def __init__(self, *args, **kwargs):
         super(SearchAppointmentsForm, self).__init__(*args, **kwargs)
+        set_patient_typeahead_url(self.patient_id)
 
-        # Populate the choices for patient_id, doctor_id, and facility_id dynamically from the database
-        db_session = db.get_db()  # Assumed function to get the database session
+        # Populate the choices for doctor_id and facility_id dynamically from the database
+        db_session = db.get_db()  # Request-scoped session shared with the view
 
-        patient_data = get_all_patients(db_session)
-        self.patient_id.choices = [(0, 'Any')] + [(pat['patient_id'], f"{pat['fname']} {pat['lname']}") for pat in
-                                                  patient_data]
-
-        doctor_data = get_all_doctors(db_session)
+        doctor_data = reference_cache.get(DOCTORS, get_all_doctors, db_session)
         self.doctor_id.choices = [(0, 'Any')] + [(doc['EMPID'], f"{doc['fname']} {doc['lname']}") for doc in
                                                  doctor_data]
 
-        facility_data = retrieve_facilities(db.get_db())
+        facility_data = reference_cache.get(FACILITIES, retrieve_facilities, db_session)
         self.facility_id.choices = [(0, 'Any')] + [(data['facility_id'], f"{data['facility_id']} - {data['ftype']}") for
                                                    data in
                                                    facility_data]
@@ -192,5 +233,39 @@ class UpdateCostForm(FlaskForm):
     cost = DecimalField('New Cost', validators=[DataRequired(), NumberRange(min=0)], places=2, default=0.00)
     submit = SubmitField('Update Cost')
 
+
+class CostEntryForm(Form):
+    # One row of BulkCostUpdateForm; the appointment key travels in hidden fields
+    patient_id = HiddenField()
+    facility_id = HiddenField()
+    doctor_id = HiddenField()
+    date_time = HiddenField()
+    original_cost = HiddenField()
+    cost = DecimalField('Cost', validators=[Optional(), NumberRange(min=0)], places=2)
+
+
+class BulkCostUpdateForm(FlaskForm):
+    entries = FieldList(FormField(CostEntryForm))
+    submit = SubmitField('Save Costs')
+
+    def changed_costs(self):
+        """
+        Return the edits whose cost differs from the value originally rendered.
+        """
+        changes = []
+        for entry in self.entries:
+            cost = entry.form.cost.data
+            original_cost = entry.form.original_cost.data
+            if cost is None or (original_cost and Decimal(original_cost) == cost):
+                continue
+            changes.append({
+                'patient_id': int(entry.form.patient_id.data),
+                'facility_id': int(entry.form.facility_id.data),
+                'doctor_id': int(entry.form.doctor_id.data),
+                'date_time': entry.form.date_time.data,
+                'cost': cost
+            })
+        return changes
+
 # class RevenueByFacilityForm(FlaskForm):
 #     revenue_date = DateField('Invoice Date', format='%Y-%m-%d', validators=[DataRequired()])
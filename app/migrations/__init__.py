@@ -0,0 +1,129 @@
+"""
+Versioned schema migrations.
+
+Each migration is a module in this package named ``m<version>_<name>.py`` that
+defines ``upgrade(session)``. Applied versions are recorded in the
+``schema_version`` table, so a worker starting against an up-to-date schema only
+runs a single ``SELECT MAX(version)``.
+"""
+import importlib
+import logging
+import pkgutil
+import re
+from datetime import datetime
+
+from sqlalchemy import text, DDL
+from sqlalchemy.exc import ProgrammingError
+from sqlalchemy.orm import Session
+
+MIGRATION_LOCK = 'schema_migrations'
+MIGRATION_LOCK_TIMEOUT = 60
+
+_MODULE_PATTERN = re.compile(r'^m(\d+)_(\w+)$')
+
+
+class Migration:
+    def __init__(self, version, name, upgrade):
+        self.version = version
+        self.name = name
+        self.upgrade = upgrade
+
+
+def discover_migrations():
+    """
+    Load the migration modules of this package, ordered by version.
+    """
+    migrations = []
+    for module_info in pkgutil.iter_modules(__path__):
+        match = _MODULE_PATTERN.match(module_info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{module_info.name}")
+        migrations.append(Migration(int(match.group(1)), match.group(2), module.upgrade))
+    migrations.sort(key=lambda migration: migration.version)
+    return migrations
+
+
+INVOICE_DETAILS_TRIGGERS = ('after_invoice_details_insert', 'after_invoice_details_delete',
+                            'after_invoice_details_update')
+
+
+def replace_invoice_details_triggers(session, *create_statements):
+    """
+    Drop the InvoiceDetails total_cost triggers and create them from
+    create_statements. Each migration passes its own copy of the trigger
+    DDL, so replaying the history installs what every version shipped.
+    """
+    for trigger_name in INVOICE_DETAILS_TRIGGERS:
+        session.execute(text(f"DROP TRIGGER IF EXISTS {trigger_name}"))
+    for statement in create_statements:
+        session.execute(DDL(statement))
+    session.commit()
+
+
+def create_schema_version_table(session):
+    session.execute(text("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INT NOT NULL,
+            name VARCHAR(255) NOT NULL,
+            applied_at DATETIME NOT NULL,
+            PRIMARY KEY (version)
+        );
+    """))
+    session.commit()
+
+
+def current_version(session):
+    """
+    Return the highest applied migration version, or 0 for a fresh database.
+    """
+    try:
+        return session.execute(text("SELECT MAX(version) FROM schema_version")).scalar() or 0
+    except ProgrammingError:
+        # schema_version does not exist yet
+        session.rollback()
+        return 0
+
+
+def run_migrations(engine):
+    """
+    Apply pending migrations. All work runs on one connection so the
+    GET_LOCK advisory lock, which serializes workers booting at the same
+    time, is held until the last migration is recorded.
+    """
+    migrations = discover_migrations()
+    latest = migrations[-1].version if migrations else 0
+
+    with engine.connect() as connection:
+        session = Session(bind=connection)
+        try:
+            version = current_version(session)
+            if version >= latest:
+                return version
+
+            locked = session.execute(text("SELECT GET_LOCK(:name, :timeout)"),
+                                     {'name': MIGRATION_LOCK, 'timeout': MIGRATION_LOCK_TIMEOUT}).scalar()
+            if locked != 1:
+                # 0 on timeout, NULL on error: another worker is still migrating, so do not run alongside it
+                raise RuntimeError(f"Could not acquire the {MIGRATION_LOCK} lock within "
+                                   f"{MIGRATION_LOCK_TIMEOUT}s; another worker is still applying migrations")
+            try:
+                create_schema_version_table(session)
+                # Another worker may have migrated while we waited for the lock
+                version = current_version(session)
+                for migration in migrations:
+                    if migration.version <= version:
+                        continue
+                    logging.info(f"Applying migration {migration.version}: {migration.name}")
+                    migration.upgrade(session)
+                    session.execute(text("""
+                        INSERT INTO schema_version (version, name, applied_at)
+                        VALUES (:version, :name, :applied_at)
+                    """), {'version': migration.version, 'name': migration.name, 'applied_at': datetime.now()})
+                    session.commit()
+                    version = migration.version
+            finally:
+                session.execute(text("SELECT RELEASE_LOCK(:name)"), {'name': MIGRATION_LOCK})
+            return version
+        finally:
+            session.close()
@@ -0,0 +1,14 @@
+from app.Database import create_facility_tables, create_employee_tables, create_employee_sublcass_tables, \
+    create_insurance_tables, create_treats_tables, create_patient_table, create_appointments_tables, \
+    create_invoice_tables
+
+
+def upgrade(session):
+    create_facility_tables(session)
+    create_employee_tables(session)
+    create_employee_sublcass_tables(session)
+    create_insurance_tables(session)
+    create_patient_table(session)
+    create_treats_tables(session)
+    create_appointments_tables(session)
+    create_invoice_tables(session)
@@ -0,0 +1,24 @@
+import logging
+
+from sqlalchemy import text
+
+from app.Database import index_exists
+
+# Secondary indexes backing the report and booking filters: (table, index name, columns)
+REPORT_INDEXES = [
+    ('Invoice', 'idx_invoice_insurance_date', 'insurance_id, date'),
+    ('Invoice', 'idx_invoice_date', 'date'),
+    ('InvoiceDetails', 'idx_invoice_details_date_time', 'date_time'),
+    ('Appointments', 'idx_appointments_doctor_date', 'doctor_id, date_time'),
+    ('Appointments', 'idx_appointments_facility_date', 'facility_id, date_time'),
+]
+
+
+def upgrade(session):
+    # MySQL has no CREATE INDEX IF NOT EXISTS, so each index is checked in information_schema first
+    for table_name, index_name, columns in REPORT_INDEXES:
+        if index_exists(session, table_name, index_name):
+            continue
+        session.execute(text(f"CREATE INDEX {index_name} ON {table_name} ({columns})"))
+        session.commit()
+        logging.info(f"Created index {index_name} on {table_name}.")
@@ -0,0 +1,39 @@
+from app.migrations import replace_invoice_details_triggers
+
+# Keep Invoice.total_cost in step with its InvoiceDetails rows
+INSERT_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_insert
+    AFTER INSERT ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        UPDATE Invoice
+        SET total_cost = total_cost + NEW.cost
+        WHERE invoice_id = NEW.invoice_id;
+    END;
+"""
+
+DELETE_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_delete
+    AFTER DELETE ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        UPDATE Invoice
+        SET total_cost = total_cost - OLD.cost
+        WHERE invoice_id = OLD.invoice_id;
+    END;
+"""
+
+UPDATE_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_update
+    AFTER UPDATE ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        UPDATE Invoice
+        SET total_cost = total_cost - OLD.cost + NEW.cost
+        WHERE invoice_id = NEW.invoice_id;
+    END;
+"""
+
+
+def upgrade(session):
+    replace_invoice_details_triggers(session, INSERT_TRIGGER, DELETE_TRIGGER, UPDATE_TRIGGER)
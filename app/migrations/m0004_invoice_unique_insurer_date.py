@@ -0,0 +1,60 @@
+from sqlalchemy import text
+
+from app.Database import index_exists
+
+
+def upgrade(session):
+    """
+    Enforce one Invoice per (insurance_id, date) so bookings can resolve their
+    invoice with an upsert. Existing duplicates are merged into the lowest
+    invoice_id first.
+    """
+    session.execute(text("""
+        CREATE TEMPORARY TABLE invoice_keepers AS
+        SELECT insurance_id, date, MIN(invoice_id) AS keep_id
+        FROM Invoice
+        WHERE insurance_id IS NOT NULL
+        GROUP BY insurance_id, date
+        HAVING COUNT(*) > 1
+    """))
+    # (duplicate, keeper) pairs, so the detail update below does not read Invoice: the
+    # InvoiceDetails triggers update Invoice, and MySQL rejects that (ERROR 1442) for a
+    # statement that reads the table itself
+    session.execute(text("""
+        CREATE TEMPORARY TABLE invoice_merges AS
+        SELECT i.invoice_id AS old_id, k.keep_id
+        FROM Invoice i
+        JOIN invoice_keepers k ON i.insurance_id = k.insurance_id AND i.date = k.date
+        WHERE i.invoice_id <> k.keep_id
+    """))
+    # The triggers installed from migration 5 on honour this guard
+    session.execute(text("SET @skip_invoice_total_trigger = 1"))
+    session.execute(text("""
+        UPDATE InvoiceDetails id
+        JOIN invoice_merges m ON id.invoice_id = m.old_id
+        SET id.invoice_id = m.keep_id
+    """))
+    session.execute(text("SET @skip_invoice_total_trigger = NULL"))
+    # Recompute the keepers' totals from their merged details
+    session.execute(text("""
+        UPDATE Invoice i
+        JOIN invoice_keepers k ON i.invoice_id = k.keep_id
+        SET i.total_cost = (SELECT COALESCE(SUM(id.cost), 0) FROM InvoiceDetails id
+                            WHERE id.invoice_id = i.invoice_id)
+    """))
+    session.execute(text("""
+        DELETE i FROM Invoice i
+        JOIN invoice_merges m ON i.invoice_id = m.old_id
+    """))
+    session.execute(text("DROP TEMPORARY TABLE invoice_merges"))
+    session.execute(text("DROP TEMPORARY TABLE invoice_keepers"))
+    session.commit()
+
+    if not index_exists(session, 'Invoice', 'uq_invoice_insurance_date'):
+        session.execute(text("""
+            ALTER TABLE Invoice ADD UNIQUE KEY uq_invoice_insurance_date (insurance_id, date)
+        """))
+    # The unique key covers the same columns as the plain index added in migration 2
+    if index_exists(session, 'Invoice', 'idx_invoice_insurance_date'):
+        session.execute(text("DROP INDEX idx_invoice_insurance_date ON Invoice"))
+    session.commit()
@@ -0,0 +1,58 @@
+from app.migrations import replace_invoice_details_triggers
+
+# The triggers do nothing while the connection variable @skip_invoice_total_trigger is set; bulk
+# writers set it and recompute the affected Invoice totals once instead of once per row. A detail
+# moved to another invoice updates both totals.
+INSERT_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_insert
+    AFTER INSERT ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        IF @skip_invoice_total_trigger IS NULL THEN
+            UPDATE Invoice
+            SET total_cost = total_cost + NEW.cost
+            WHERE invoice_id = NEW.invoice_id;
+        END IF;
+    END;
+"""
+
+DELETE_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_delete
+    AFTER DELETE ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        IF @skip_invoice_total_trigger IS NULL THEN
+            UPDATE Invoice
+            SET total_cost = total_cost - OLD.cost
+            WHERE invoice_id = OLD.invoice_id;
+        END IF;
+    END;
+"""
+
+UPDATE_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_update
+    AFTER UPDATE ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        IF @skip_invoice_total_trigger IS NULL THEN
+            IF NEW.invoice_id = OLD.invoice_id THEN
+                IF NOT (NEW.cost <=> OLD.cost) THEN
+                    UPDATE Invoice
+                    SET total_cost = total_cost - OLD.cost + NEW.cost
+                    WHERE invoice_id = NEW.invoice_id;
+                END IF;
+            ELSE
+                UPDATE Invoice
+                SET total_cost = total_cost - OLD.cost
+                WHERE invoice_id = OLD.invoice_id;
+                UPDATE Invoice
+                SET total_cost = total_cost + NEW.cost
+                WHERE invoice_id = NEW.invoice_id;
+            END IF;
+        END IF;
+    END;
+"""
+
+
+def upgrade(session):
+    replace_invoice_details_triggers(session, INSERT_TRIGGER, DELETE_TRIGGER, UPDATE_TRIGGER)
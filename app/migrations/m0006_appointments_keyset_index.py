@@ -0,0 +1,13 @@
+from sqlalchemy import text
+
+from app.Database import index_exists
+
+
+def upgrade(session):
+    # Matches the keyset ordering used by search_appointments_page
+    if not index_exists(session, 'Appointments', 'idx_appointments_date_time'):
+        session.execute(text("""
+            CREATE INDEX idx_appointments_date_time
+            ON Appointments (date_time, patient_id, facility_id, doctor_id)
+        """))
+    session.commit()
@@ -0,0 +1,16 @@
+from sqlalchemy import text
+
+from app.Database import index_exists
+
+# Prefix searches on either name column (see patient_crud.search_patients)
+PATIENT_NAME_INDEXES = [
+    ('idx_patient_lname', 'lname, fname'),
+    ('idx_patient_fname', 'fname, lname'),
+]
+
+
+def upgrade(session):
+    for index_name, columns in PATIENT_NAME_INDEXES:
+        if not index_exists(session, 'Patient', index_name):
+            session.execute(text(f"CREATE INDEX {index_name} ON Patient ({columns})"))
+    session.commit()
@@ -0,0 +1,18 @@
+from sqlalchemy import text
+
+from app.Database import index_exists
+
+# Support employee_crud.search_employees: per-job_class EMPID keysets, facility filter and name prefixes
+EMPLOYEE_INDEXES = [
+    ('idx_employee_job_class', 'job_class, EMPID'),
+    ('idx_employee_job_class_facility', 'job_class, facility_id, EMPID'),
+    ('idx_employee_lname', 'lname, fname'),
+    ('idx_employee_fname', 'fname, lname'),
+]
+
+
+def upgrade(session):
+    for index_name, columns in EMPLOYEE_INDEXES:
+        if not index_exists(session, 'Employee', index_name):
+            session.execute(text(f"CREATE INDEX {index_name} ON Employee ({columns})"))
+    session.commit()
@@ -0,0 +1,24 @@
+from sqlalchemy import text
+
+from crud_helpers.daily_revenue import rebuild_daily_revenue
+
+# Summary of InvoiceDetails per (invoice date, facility, insurer, patient), maintained
+# incrementally by crud_helpers.daily_revenue and read by the revenue reports
+DAILY_REVENUE_TABLE = """
+    CREATE TABLE IF NOT EXISTS DailyRevenue (
+        date DATE NOT NULL,
+        facility_id INT NOT NULL,
+        insurance_id INT NOT NULL,
+        patient_id INT NOT NULL,
+        revenue DECIMAL(14, 2) NOT NULL DEFAULT 0,
+        appt_count INT NOT NULL DEFAULT 0,
+        PRIMARY KEY (date, facility_id, insurance_id, patient_id),
+        KEY idx_daily_revenue_insurance_date (insurance_id, date)
+    );
+"""
+
+
+def upgrade(session):
+    session.execute(text(DAILY_REVENUE_TABLE))
+    session.commit()
+    rebuild_daily_revenue(session)
@@ -0,0 +1,80 @@
+from sqlalchemy import text
+
+from app.migrations import replace_invoice_details_triggers
+
+# Invoices whose total_cost is stale in the deferred invoice_totals_mode (keyed by invoice; see migration 12)
+QUEUE_TABLE = """
+    CREATE TABLE IF NOT EXISTS InvoiceTotalQueue (
+        invoice_id INT NOT NULL,
+        PRIMARY KEY (invoice_id)
+    );
+"""
+
+# While @defer_invoice_totals is set, the triggers queue the invoice instead of updating its total
+INSERT_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_insert
+    AFTER INSERT ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        IF @skip_invoice_total_trigger IS NULL THEN
+            IF @defer_invoice_totals IS NULL THEN
+                UPDATE Invoice
+                SET total_cost = total_cost + NEW.cost
+                WHERE invoice_id = NEW.invoice_id;
+            ELSE
+                INSERT IGNORE INTO InvoiceTotalQueue (invoice_id) VALUES (NEW.invoice_id);
+            END IF;
+        END IF;
+    END;
+"""
+
+DELETE_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_delete
+    AFTER DELETE ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        IF @skip_invoice_total_trigger IS NULL THEN
+            IF @defer_invoice_totals IS NULL THEN
+                UPDATE Invoice
+                SET total_cost = total_cost - OLD.cost
+                WHERE invoice_id = OLD.invoice_id;
+            ELSE
+                INSERT IGNORE INTO InvoiceTotalQueue (invoice_id) VALUES (OLD.invoice_id);
+            END IF;
+        END IF;
+    END;
+"""
+
+UPDATE_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_update
+    AFTER UPDATE ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        IF @skip_invoice_total_trigger IS NULL AND @defer_invoice_totals IS NOT NULL THEN
+            IF NOT (NEW.cost <=> OLD.cost) OR NEW.invoice_id <> OLD.invoice_id THEN
+                INSERT IGNORE INTO InvoiceTotalQueue (invoice_id) VALUES (OLD.invoice_id), (NEW.invoice_id);
+            END IF;
+        ELSEIF @skip_invoice_total_trigger IS NULL THEN
+            IF NEW.invoice_id = OLD.invoice_id THEN
+                IF NOT (NEW.cost <=> OLD.cost) THEN
+                    UPDATE Invoice
+                    SET total_cost = total_cost - OLD.cost + NEW.cost
+                    WHERE invoice_id = NEW.invoice_id;
+                END IF;
+            ELSE
+                UPDATE Invoice
+                SET total_cost = total_cost - OLD.cost
+                WHERE invoice_id = OLD.invoice_id;
+                UPDATE Invoice
+                SET total_cost = total_cost + NEW.cost
+                WHERE invoice_id = NEW.invoice_id;
+            END IF;
+        END IF;
+    END;
+"""
+
+
+def upgrade(session):
+    session.execute(text(QUEUE_TABLE))
+    session.commit()
+    replace_invoice_details_triggers(session, INSERT_TRIGGER, DELETE_TRIGGER, UPDATE_TRIGGER)
@@ -0,0 +1,27 @@
+from sqlalchemy import text
+
+APPOINTMENT_KEY = 'patient_id, facility_id, doctor_id, date_time'
+
+
+def upgrade(session):
+    """
+    Let InvoiceDetails follow changes to an Appointments key (ON UPDATE
+    CASCADE), so rescheduling can update the appointment in place instead
+    of deleting and reinserting its detail. The original constraint was
+    created without a name, so it is looked up in information_schema.
+    """
+    constraints = session.execute(text("""
+        SELECT CONSTRAINT_NAME, UPDATE_RULE FROM information_schema.REFERENTIAL_CONSTRAINTS
+        WHERE CONSTRAINT_SCHEMA = DATABASE() AND TABLE_NAME = 'InvoiceDetails'
+          AND REFERENCED_TABLE_NAME = 'Appointments'
+    """)).all()
+    if any(update_rule == 'CASCADE' for _, update_rule in constraints):
+        return
+    for constraint_name, _ in constraints:
+        session.execute(text(f"ALTER TABLE InvoiceDetails DROP FOREIGN KEY `{constraint_name}`"))
+    session.execute(text(f"""
+        ALTER TABLE InvoiceDetails
+        ADD CONSTRAINT fk_invoice_details_appointment FOREIGN KEY ({APPOINTMENT_KEY})
+        REFERENCES Appointments ({APPOINTMENT_KEY}) ON UPDATE CASCADE
+    """))
+    session.commit()
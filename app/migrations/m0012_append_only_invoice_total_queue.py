@@ -0,0 +1,86 @@
+from sqlalchemy import text
+
+from app.Database import index_exists
+from app.migrations import replace_invoice_details_triggers
+
+# Each deferred write appends a row, so writers for one invoice never share a queue row
+INSERT_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_insert
+    AFTER INSERT ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        IF @skip_invoice_total_trigger IS NULL THEN
+            IF @defer_invoice_totals IS NULL THEN
+                UPDATE Invoice
+                SET total_cost = total_cost + NEW.cost
+                WHERE invoice_id = NEW.invoice_id;
+            ELSE
+                INSERT INTO InvoiceTotalQueue (invoice_id) VALUES (NEW.invoice_id);
+            END IF;
+        END IF;
+    END;
+"""
+
+DELETE_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_delete
+    AFTER DELETE ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        IF @skip_invoice_total_trigger IS NULL THEN
+            IF @defer_invoice_totals IS NULL THEN
+                UPDATE Invoice
+                SET total_cost = total_cost - OLD.cost
+                WHERE invoice_id = OLD.invoice_id;
+            ELSE
+                INSERT INTO InvoiceTotalQueue (invoice_id) VALUES (OLD.invoice_id);
+            END IF;
+        END IF;
+    END;
+"""
+
+UPDATE_TRIGGER = """
+    CREATE TRIGGER after_invoice_details_update
+    AFTER UPDATE ON InvoiceDetails
+    FOR EACH ROW
+    BEGIN
+        IF @skip_invoice_total_trigger IS NULL AND @defer_invoice_totals IS NOT NULL THEN
+            IF NOT (NEW.cost <=> OLD.cost) OR NEW.invoice_id <> OLD.invoice_id THEN
+                INSERT INTO InvoiceTotalQueue (invoice_id) VALUES (OLD.invoice_id), (NEW.invoice_id);
+            END IF;
+        ELSEIF @skip_invoice_total_trigger IS NULL THEN
+            IF NEW.invoice_id = OLD.invoice_id THEN
+                IF NOT (NEW.cost <=> OLD.cost) THEN
+                    UPDATE Invoice
+                    SET total_cost = total_cost - OLD.cost + NEW.cost
+                    WHERE invoice_id = NEW.invoice_id;
+                END IF;
+            ELSE
+                UPDATE Invoice
+                SET total_cost = total_cost - OLD.cost
+                WHERE invoice_id = OLD.invoice_id;
+                UPDATE Invoice
+                SET total_cost = total_cost + NEW.cost
+                WHERE invoice_id = NEW.invoice_id;
+            END IF;
+        END IF;
+    END;
+"""
+
+
+def upgrade(session):
+    """
+    Turn InvoiceTotalQueue into an append-only log keyed by queue_id. Keyed
+    by invoice_id, INSERT IGNORE on a queued invoice took a lock on that one
+    row, so writers for a busy invoice still waited on each other. Queued
+    invoices are kept.
+    """
+    if not index_exists(session, 'InvoiceTotalQueue', 'idx_invoice_total_queue_invoice'):
+        session.execute(text("""
+            ALTER TABLE InvoiceTotalQueue
+            DROP PRIMARY KEY,
+            ADD COLUMN queue_id BIGINT AUTO_INCREMENT FIRST,
+            ADD PRIMARY KEY (queue_id),
+            ADD KEY idx_invoice_total_queue_invoice (invoice_id)
+        """))
+        session.commit()
+    replace_invoice_details_triggers(session, INSERT_TRIGGER, DELETE_TRIGGER, UPDATE_TRIGGER)
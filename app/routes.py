@@ -1,3 +1,5 @@
+import logging
+
 from flask import Blueprint
 
 from app.views import error_views, static_views, employee, facility, insurance_companies, patient_management, \
@@ -9,11 +11,14 @@ bp = Blueprint('routes', __name__)
 # Database connection management
 @bp.before_app_request
 def before_request():
+    # No-op once this worker's pooled engine exists; rebuilds it after a fork
     db.connect()
+    db.reset_checkout_count()
 
 @bp.teardown_app_request
 def shutdown_session(response_or_exc):
-    db.disconnect()
+    logging.debug("Request used %s pooled connection checkout(s)", db.checkout_count)
+    db.remove()
 
 # Error handling
 bp.register_error_handler(404, error_views.not_found_error)
@@ -30,13 +35,19 @@ bp.add_url_rule('/view_insurance_companies', view_func=insurance_companies.view_
 bp.add_url_rule('/update_insurance_company/<insurance_id>',view_func=insurance_companies.update_insurance_company,methods=['GET', 'POST'])
 bp.add_url_rule('/add_patient_record',view_func=patient_management.add_patient_record, methods=['GET', 'POST'])
 bp.add_url_rule('/view_patient_list',view_func=patient_management.view_patient_list, methods=['GET', 'POST'])
+bp.add_url_rule('/api/patients/search',view_func=patient_management.search_patients_api, methods=['GET'])
 bp.add_url_rule('/edit_patient/<patient_id>',view_func=patient_management.edit_patient,methods=['GET', 'POST'])
 bp.add_url_rule('/delete_patient_record/<patient_id>',view_func=patient_management.delete_patient_record,methods=['GET', 'POST'])
 bp.add_url_rule('/make_appointment',view_func=appointment_management.make_appointment,methods=['GET', 'POST'])
 bp.add_url_rule('/search_appointments',view_func=appointment_management.search_appointments,methods=['GET', 'POST'])
+bp.add_url_rule('/export_appointments', view_func=appointment_management.export_appointments, methods=['GET'])
+bp.add_url_rule('/api/appointments/costs', view_func=appointment_management.update_costs_api, methods=['POST'])
+bp.add_url_rule('/api/revenue/series', view_func=appointment_management.revenue_series_api, methods=['GET'])
+bp.add_url_rule('/api/availability', view_func=appointment_management.availability_api, methods=['GET'])
 bp.add_url_rule('/update_cost/<int:patient_id>/<int:facility_id>/<int:doctor_id>/<date_time>',view_func=appointment_management.update_cost, methods=['GET', 'POST'])
 bp.add_url_rule('/edit_appointment/<int:patient_id>/<int:facility_id>/<int:doctor_id>/<date_time>',view_func=appointment_management.edit_appointment, methods=['GET', 'POST'])
 bp.add_url_rule('/daily_invoices',view_func=appointment_management.daily_invoices,methods=['GET', 'POST'])
+bp.add_url_rule('/daily_invoices/<invoice_date>/insurers/<int:insurance_id>', view_func=appointment_management.daily_insurer_invoices, methods=['GET'])
 bp.add_url_rule('/delete_insurance_company/<insurance_id>',view_func=insurance_companies.delete_insurance_company,methods=['GET', 'POST'])
 bp.add_url_rule('/update_facility/<int:surgery>/<int:office>',view_func=facility.update_facility,methods=['GET', 'POST'])
 bp.add_url_rule('/delete_employee/<int:employee_id>/<string:job_class>',view_func=employee.delete_employee,methods=['GET', 'POST'])
@@ -2,6 +2,7 @@
 from pydantic import BaseModel
 from datetime import date
 from enum import Enum
+from typing import Optional
 
 class JobClass(str, Enum):
     otherhcp = 'OtherHCP'
@@ -20,20 +21,20 @@ class EmployeeModel(BaseModel):
     facility_id: int
 
 class Doctor(EmployeeModel):
-    empid: int
+    empid: Optional[int] = None  # Assigned by the database on insert
     speciality: str
     bc_date: date
 
 class Nurse(EmployeeModel):
-    empid: int
+    empid: Optional[int] = None  # Assigned by the database on insert
     certification: str
 
 class Admin(EmployeeModel):
-    empid: int
+    empid: Optional[int] = None  # Assigned by the database on insert
     job_title: str
 
 class OtherHCP(EmployeeModel):
-    empid: int
+    empid: Optional[int] = None  # Assigned by the database on insert
     job_title: str
 from pydantic import BaseModel
 from typing import Optional
@@ -54,4 +55,12 @@ class OutpatientSurgery(Facility):
 class InsuranceCompany(BaseModel):
     insurance_id: Optional[int] = None  # Auto-incremented by the database, optional in the model
     name: str
-    address: str
\ No newline at end of file
+    address: str
+
+
+class Patient(BaseModel):
+    patient_id: Optional[int] = None  # Auto-incremented by the database, optional in the model
+    fname: str
+    lname: str
+    primary_doc_id: Optional[int] = None
+    insurance_id: Optional[int] = None
@@ -0,0 +1,29 @@
+// Load the invoices of an insurer the first time its <details> element is expanded.
+// The fragment URL is taken from the element's data-details-url attribute.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('details[data-details-url]').forEach(function (details) {
+        var body = details.querySelector('.card-body');
+        var loaded = false;
+        details.addEventListener('toggle', function () {
+            if (!details.open || loaded) {
+                return;
+            }
+            loaded = true;
+            fetch(details.dataset.detailsUrl)
+                .then(function (response) {
+                    if (!response.ok) {
+                        throw new Error(response.statusText);
+                    }
+                    return response.text();
+                })
+                .then(function (html) {
+                    body.innerHTML = html;
+                })
+                .catch(function () {
+                    // Let the next expand retry
+                    loaded = false;
+                    body.innerHTML = '<p class="alert alert-danger">Could not load invoices.</p>';
+                });
+        });
+    });
+});
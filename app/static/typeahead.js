@@ -0,0 +1,38 @@
+// Attach a server-backed suggestion list to every input with a data-typeahead-url attribute.
+// Suggestions use the patient_id as the option value and the patient name as its label.
+document.addEventListener('DOMContentLoaded', function () {
+    document.querySelectorAll('input[data-typeahead-url]').forEach(function (input, index) {
+        var list = document.createElement('datalist');
+        list.id = 'typeahead-' + index;
+        input.setAttribute('list', list.id);
+        input.after(list);
+
+        var timer = null;
+        var controller = null;
+        input.addEventListener('input', function () {
+            clearTimeout(timer);
+            var query = input.value.trim();
+            if (!query) {
+                list.replaceChildren();
+                return;
+            }
+            timer = setTimeout(function () {
+                if (controller) {
+                    controller.abort();
+                }
+                controller = new AbortController();
+                fetch(input.dataset.typeaheadUrl + '?q=' + encodeURIComponent(query), {signal: controller.signal})
+                    .then(function (response) { return response.json(); })
+                    .then(function (patients) {
+                        list.replaceChildren.apply(list, patients.map(function (patient) {
+                            var option = document.createElement('option');
+                            option.value = patient.patient_id;
+                            option.label = patient.label;
+                            return option;
+                        }));
+                    })
+                    .catch(function () {});
+            }, 150);
+        });
+    });
+});
@@ -1,6 +1,7 @@
 import logging
 import os
 import logging.config
+from datetime import date, datetime, time, timedelta
 
 
 def setup_logging():
@@ -14,3 +15,35 @@ def setup_logging():
     normalized_path = os.path.normpath(logging_config_path)
     # Apply the logging configuration.
     logging.config.fileConfig(normalized_path, disable_existing_loggers=False)
+
+
+def day_bounds(day):
+    """
+    Return the half-open [start, end) datetime range covering a calendar day.
+    Accepts a date, a datetime or a 'YYYY-MM-DD' string, so callers can compare
+    DATETIME columns against the range instead of wrapping them in DATE().
+    """
+    if isinstance(day, str):
+        day = datetime.strptime(day, '%Y-%m-%d').date()
+    elif isinstance(day, datetime):
+        day = day.date()
+    start = datetime.combine(day, time.min)
+    return start, start + timedelta(days=1)
+
+
+def revenue_day(day):
+    """
+    Normalize a date, datetime or 'YYYY-MM-DD' string to a date, for lookups
+    against DATE columns such as DailyRevenue.date.
+    """
+    return day_bounds(day)[0].date()
+
+
+def month_bounds(year, month):
+    """
+    Return the half-open [start, end) date range covering a calendar month.
+    """
+    year, month = int(year), int(month)
+    start = date(year, month, 1)
+    end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+    return start, end
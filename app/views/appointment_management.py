@@ -1,45 +1,78 @@
+import csv
+import io
+import json
 import logging
-from datetime import datetime
+from datetime import datetime, date, timedelta
+from decimal import Decimal, InvalidOperation
 
-from flask import render_template, request, redirect, url_for, session, flash
+from flask import render_template, request, redirect, url_for, session, flash, jsonify, Response, \
+    stream_with_context, abort
 from icecream import ic
 
-from app.forms import SearchAppointmentsForm, UpdateCostForm, AppointmentForm, DailyInvoiceForm, RevenueDaysForm, \
-    DateRangeForm
-from app.Database import db, total_cost_trigger
-from crud_helpers.appointment_crud import search_appointments_db, update_appointment_cost_db, get_appointment_by_id, \
-    create_appointment, update_appointment_and_related_details, search_daily_insurance_invoices, \
-    generate_top_revenue_days, \
-    generate_average_revenue_list
+from app.forms import SearchAppointmentsForm, UpdateCostForm, AppointmentForm, DailyInvoiceForm, DateRangeForm, \
+    BulkCostUpdateForm, TopRevenueDaysForm
+from app.Database import db
+from crud_helpers.appointment_crud import update_appointment_cost_db, get_appointment_by_id, \
+    create_appointment, reschedule_appointment, search_daily_insurance_invoices, \
+    search_daily_insurer_invoices, \
+    update_appointment_costs_bulk, search_appointments_page, estimate_appointment_count, \
+    iter_appointments
+from crud_helpers.availability import find_free_slots, busy_intervals, AVAILABILITY_COLUMNS
+from crud_helpers.daily_revenue import generate_revenue_series, generate_top_revenue_days_window, \
+    generate_insurer_revenue_distribution, SERIES_GROUPS
+from crud_helpers.facility_crud import retrieve_facilities
+from crud_helpers.insurance_crud import retrieve_insurance_companies
+from crud_helpers.reference_cache import reference_cache, FACILITIES, INSURANCE_COMPANIES
+from crud_helpers.report_cache import month_span
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+COUNT_ESTIMATE_CAP = 1000
+MAX_SERIES_DAYS = 3660
+MAX_FREE_SLOTS = 50
+MAX_SLOT_SEARCH_DAYS = 60
 
 
 def daily_invoices():
     form = DailyInvoiceForm(request.form)
-    invoices_by_insurance = {}
     if request.method == 'POST' and form.validate():
         # Store the selected date in session after validating form submission
         session['invoice_date'] = form.invoice_date.data.strftime('%Y-%m-%d')
         return redirect(url_for('routes.daily_invoices'))  # Redirect to clear POST data and avoid re-submission issues
 
-    if 'invoice_date' in session:
-        # Fetch invoices using the date stored in session if available
-        invoice_date = session['invoice_date']
-        invoices_by_insurance = search_daily_insurance_invoices(db.get_db(), invoice_date)
-    else:
-        # Set a default date or handle the case where no date is selected
-        invoice_date = datetime.now().strftime('%Y-%m-%d')
-        invoices_by_insurance = search_daily_insurance_invoices(db.get_db(), invoice_date)
+    # Use the date stored in session if available, otherwise today
+    invoice_date = session.get('invoice_date', datetime.now().strftime('%Y-%m-%d'))
+    # One summary row per insurer; each insurer's invoices are fetched when it is expanded
+    insurers = search_daily_insurance_invoices(db.get_db(), invoice_date)
+    return render_template('daily_invoice_view.html', form=form, insurers=insurers, invoice_date=invoice_date)
+
 
-    return render_template('daily_invoice_view.html', form=form, invoices_by_insurance=invoices_by_insurance,
-                           invoice_date=invoice_date)
+def daily_insurer_invoices(invoice_date, insurance_id):
+    """
+    HTML fragment with the invoices and patient charges of one insurer on one day,
+    loaded by daily_invoice_view.html when the insurer is expanded.
+    """
+    try:
+        invoice_date = date.fromisoformat(invoice_date)
+    except ValueError:
+        abort(400)
+    invoices = search_daily_insurer_invoices(db.get_db(), invoice_date, insurance_id)
+    return render_template('daily_invoice_details.html', invoices=invoices)
 
 
 def search_appointments():
     form = SearchAppointmentsForm(request.form)
-    update_forms = {}
+    cost_form = BulkCostUpdateForm(prefix='costs')
     appointments = []
 
-    if form.validate_on_submit():
+    if cost_form.submit.data and cost_form.validate_on_submit():
+        changes = cost_form.changed_costs()
+        if changes:
+            updated = update_appointment_costs_bulk(db.get_db(), changes)
+            flash(f'{updated} cost(s) updated successfully', 'success')
+        return redirect(url_for('routes.search_appointments'))  # Correctly namespaced
+
+    if form.submit.data and form.validate_on_submit():
         session['search_filters'] = {
             'patient_id': form.patient_id.data,
             'doctor_id': form.doctor_id.data,
@@ -50,32 +83,108 @@ def search_appointments():
 
         return redirect(url_for('routes.search_appointments'))  # Correctly namespaced
 
+    page = {'next_cursor': None, 'prev_cursor': None}
+    page_size = min(max(request.args.get('per_page', DEFAULT_PAGE_SIZE, type=int), 1), MAX_PAGE_SIZE)
+    match_count = None
     if 'search_filters' in session:
         filters = session['search_filters']
-        appointments = search_appointments_db(db.get_db(), **filters)
+        try:
+            page = search_appointments_page(db.get_db(), filters, after=request.args.get('after'),
+                                            before=request.args.get('before'), page_size=page_size)
+        except ValueError:
+            flash('Invalid page cursor', 'error')
+            return redirect(url_for('routes.search_appointments'))
+        appointments = page['appointments']
+        if request.args.get('count'):
+            match_count = estimate_appointment_count(db.get_db(), filters, cap=COUNT_ESTIMATE_CAP)
         for appointment in appointments:
-            form_key = (
-            appointment['patient_id'], appointment['facility_id'], appointment['doctor_id'], appointment['date_time'])
-            appointment['form_key'] = form_key  # Store the form key as a tuple
-            update_forms[form_key] = UpdateCostForm(prefix='_'.join(map(str, form_key)))
-
-    if request.method == 'POST':
-        for form_key, update_form in update_forms.items():
-            if update_form.validate_on_submit():
-                patient_id, facility_id, doctor_id, date_time = form_key
-                update_appointment_cost_db(
-                    db.get_db(),
-                    patient_id=patient_id,
-                    facility_id=facility_id,
-                    doctor_id=doctor_id,
-                    date_time=date_time,
-                    new_cost=update_form.cost.data
-                )
-
-                flash(f'Cost updated successfully', 'success')
-                return redirect(url_for('routes.search_appointments'))  # Correctly namespaced
-
-    return render_template('search_appointment.html', form=form, appointments=appointments, update_forms=update_forms)
+            cost_form.entries.append_entry({
+                'patient_id': appointment['patient_id'],
+                'facility_id': appointment['facility_id'],
+                'doctor_id': appointment['doctor_id'],
+                'date_time': appointment['date_time'],
+                'original_cost': appointment['cost'],
+                'cost': appointment['cost']
+            })
+
+    return render_template('search_appointment.html', form=form, appointments=appointments, cost_form=cost_form,
+                           next_cursor=page['next_cursor'], prev_cursor=page['prev_cursor'], per_page=page_size,
+                           match_count=match_count, count_cap=COUNT_ESTIMATE_CAP,
+                           export_args=export_query_args(session.get('search_filters', {})))
+
+
+def update_costs_api():
+    """
+    Apply a batch of cost edits posted as JSON:
+    {"updates": [{"patient_id", "facility_id", "doctor_id", "date_time", "cost"}, ...]}
+    """
+    payload = request.get_json(silent=True) or {}
+    try:
+        updates = [{
+            'patient_id': int(update['patient_id']),
+            'facility_id': int(update['facility_id']),
+            'doctor_id': int(update['doctor_id']),
+            'date_time': datetime.fromisoformat(update['date_time']),
+            'cost': Decimal(str(update['cost']))
+        } for update in payload.get('updates', [])]
+    except (KeyError, TypeError, ValueError, InvalidOperation) as e:
+        return jsonify({'error': f'Invalid update: {e}'}), 400
+    if any(update['cost'] < 0 for update in updates):
+        return jsonify({'error': 'Cost must be non-negative'}), 400
+
+    updated = update_appointment_costs_bulk(db.get_db(), updates)
+    return jsonify({'updated': updated})
+
+
+EXPORT_COLUMNS = ['patient_id', 'doctor_id', 'facility_id', 'date_time', 'cost', 'description']
+
+
+def export_appointments():
+    """
+    Stream appointments matching the SearchAppointmentsForm filters (passed as
+    query arguments) as CSV, or as NDJSON with format=ndjson.
+    """
+    form = SearchAppointmentsForm(request.args, meta={'csrf': False})
+    if not form.validate():
+        return jsonify({'errors': form.errors}), 400
+    filters = {
+        'patient_id': form.patient_id.data,
+        'doctor_id': form.doctor_id.data,
+        'facility_id': form.facility_id.data,
+        'start_date': form.start_date.data,
+        'end_date': form.end_date.data
+    }
+    rows = iter_appointments(db.get_db(), filters)
+
+    if request.args.get('format') == 'ndjson':
+        lines = (json.dumps(row, default=str) + '\n' for row in rows)
+        return Response(stream_with_context(lines), mimetype='application/x-ndjson',
+                        headers={'Content-Disposition': 'attachment; filename=appointments.ndjson'})
+
+    def csv_lines():
+        buffer = io.StringIO()
+        writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+        writer.writeheader()
+        for row in rows:
+            writer.writerow(row)
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+        yield buffer.getvalue()
+
+    return Response(stream_with_context(csv_lines()), mimetype='text/csv',
+                    headers={'Content-Disposition': 'attachment; filename=appointments.csv'})
+
+
+def export_query_args(filters):
+    """
+    Turn the search filters stored in the session into export_appointments query arguments.
+    """
+    args = {key: filters[key] for key in ('patient_id', 'doctor_id', 'facility_id') if filters.get(key)}
+    for key in ('start_date', 'end_date'):
+        if filters.get(key):
+            args[key] = filters[key].strftime('%Y-%m-%dT%H:%M')
+    return args
 
 
 def edit_appointment(patient_id, facility_id, doctor_id, date_time):
@@ -100,10 +209,12 @@ def edit_appointment(patient_id, facility_id, doctor_id, date_time):
         logging.info(f"Updating appointment {appointment} with new data: {updated_data}")
 
         # Update the appointment in the database
-        update_appointment_and_related_details(db_session, appointment,
-                                               updated_data)  # This function should handle the update logic
-        flash('Appointment updated successfully!', 'success')
-        return redirect(url_for('routes.search_appointments'))  # Redirect to appointment search
+        try:
+            reschedule_appointment(db_session, appointment, updated_data)
+            flash('Appointment updated successfully!', 'success')
+            return redirect(url_for('routes.search_appointments'))  # Redirect to appointment search
+        except Exception as e:
+            flash(str(e), 'danger')
 
     return render_template('update.html', form=form)
 
@@ -154,23 +265,39 @@ def make_appointment():
 
 
 def top_revenue_days():
-    today = datetime.now()
-    default_monthyear = today.strftime('%Y-%m')
-
-    if request.method == 'POST':
-        # Directly read the month/year from the form input
-        session['selected_monthyear'] = request.form['monthInput']
+    form = TopRevenueDaysForm()
+    if form.validate_on_submit():
+        session['top_revenue_window'] = {
+            'begin_date': form.begin_date.data.strftime('%Y-%m-%d'),
+            'end_date': form.end_date.data.strftime('%Y-%m-%d'),
+            'k': form.k.data,
+            'group_by': form.group_by.data or None,
+        }
         return redirect(url_for('routes.top_revenue_days'))
 
-    revenues = []
-    # Fetch monthyear either from session or use the default
-    monthyear = session.get('selected_monthyear', default_monthyear)
-    year, month = monthyear.split('-')
-    revenues = generate_top_revenue_days(db.get_db(), year, month)
-
-    return render_template('top_revenues.html', revenues=revenues,
-                           selected_monthyear=monthyear)
-
+    # Default to the current month, as the page did before it took arbitrary windows
+    month_start, month_end = month_span(date.today().year, date.today().month)
+    window = session.get('top_revenue_window', {'begin_date': month_start.isoformat(),
+                                                'end_date': month_end.isoformat(), 'k': 5, 'group_by': None})
+    if request.method == 'GET':
+        form.begin_date.data = date.fromisoformat(window['begin_date'])
+        form.end_date.data = date.fromisoformat(window['end_date'])
+        form.k.data = window['k']
+        form.group_by.data = window['group_by'] or ''
+
+    revenues = generate_top_revenue_days_window(db.get_db(), date.fromisoformat(window['begin_date']),
+                                                date.fromisoformat(window['end_date']), window['k'],
+                                                window['group_by'])
+    group_labels = {}
+    if window['group_by'] == 'facility':
+        group_labels = {facility['facility_id']: f"Facility {facility['facility_id']} - {facility['address']}"
+                        for facility in reference_cache.get(FACILITIES, retrieve_facilities, db.get_db())}
+    elif window['group_by'] == 'insurer':
+        group_labels = {company['insurance_id']: company['name'] for company in
+                        reference_cache.get(INSURANCE_COMPANIES, retrieve_insurance_companies, db.get_db())}
+
+    return render_template('top_revenues.html', form=form, revenues=revenues, window=window,
+                           group_labels=group_labels)
 
 
 def average_revenue():
@@ -182,8 +309,60 @@ def average_revenue():
 
     revenues = []
     if 'begin_date' in session and 'end_date' in session:
-        begin_date = session['begin_date']
-        end_date = session['end_date']
-        revenues = generate_average_revenue_list(db.get_db(), begin_date, end_date)
+        begin_date = date.fromisoformat(session['begin_date'])
+        end_date = date.fromisoformat(session['end_date'])
+        revenues = generate_insurer_revenue_distribution(db.get_db(), begin_date, end_date)
+
+    return render_template('average_revenues.html', form=form, revenues=revenues)
+
 
-    return render_template('average_revenues.html', form=form, revenues=revenues)
\ No newline at end of file
+def revenue_series_api():
+    """
+    /api/revenue/series?start=YYYY-MM-DD&end=YYYY-MM-DD&group_by=facility|insurer
+    returns zero-filled daily revenue arrays per facility or insurer.
+    """
+    group_by = request.args.get('group_by', 'facility')
+    if group_by not in SERIES_GROUPS:
+        return jsonify({'error': f"group_by must be one of {', '.join(SERIES_GROUPS)}"}), 400
+    try:
+        start_date = date.fromisoformat(request.args['start'])
+        end_date = date.fromisoformat(request.args['end'])
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': f'start and end must be YYYY-MM-DD dates: {e}'}), 400
+    if not 0 <= (end_date - start_date).days < MAX_SERIES_DAYS:
+        return jsonify({'error': f'end must be on or after start, at most {MAX_SERIES_DAYS} days later'}), 400
+
+    revenue_series = generate_revenue_series(db.get_db(), start_date, end_date, group_by)
+    return jsonify({'start': start_date.isoformat(), 'end': end_date.isoformat(), 'group_by': group_by,
+                    **revenue_series})
+
+
+def availability_api():
+    """
+    /api/availability?doctor_id=<id>|facility_id=<id>&start=<ISO datetime>&count=5&length=<minutes>&days=14
+    returns the next free slots and the busy intervals of that doctor or facility.
+    """
+    owners = [(kind, request.args.get(column, type=int)) for kind, column in AVAILABILITY_COLUMNS.items()
+              if request.args.get(column)]
+    if len(owners) != 1 or owners[0][1] is None:
+        return jsonify({'error': 'Pass exactly one of doctor_id or facility_id'}), 400
+    kind, owner_id = owners[0]
+    try:
+        start = datetime.fromisoformat(request.args['start']) if request.args.get('start') else datetime.now()
+    except ValueError as e:
+        return jsonify({'error': f'Invalid start: {e}'}), 400
+    count = min(max(request.args.get('count', 5, type=int), 1), MAX_FREE_SLOTS)
+    days = min(max(request.args.get('days', 14, type=int), 1), MAX_SLOT_SEARCH_DAYS)
+    length = request.args.get('length', type=int)
+    if length is not None and length <= 0:
+        return jsonify({'error': 'length must be a positive number of minutes'}), 400
+
+    session = db.get_db()
+    slots = find_free_slots(session, kind, owner_id, start, count,
+                            timedelta(minutes=length) if length else None, days)
+    busy = busy_intervals(session, kind, owner_id, start.date(), start.date())
+    return jsonify({
+        kind + '_id': owner_id,
+        'slots': [{'start': slot_start.isoformat(), 'end': slot_end.isoformat()} for slot_start, slot_end in slots],
+        'busy': [{'start': busy_start.isoformat(), 'end': busy_end.isoformat()} for busy_start, busy_end in busy],
+    })
@@ -1,12 +1,15 @@
 
 
-from app.forms import DoctorForm, NurseForm, AdminForm, OtherHCPForm
+from app.forms import DoctorForm, NurseForm, AdminForm, OtherHCPForm, EmployeeFilterForm
 from app.Database import db
 from icecream import ic
 from flask import render_template, request, redirect, url_for, flash
 
-from crud_helpers.employee_crud import create_employee, retrieve_all_employees, update_employee_entry, \
-                                        select_employee_by_id, delete_employee_entry
+from crud_helpers.employee_crud import create_employee, update_employee_entry, \
+                                        select_employee_by_id, delete_employee_entry, search_employees, \
+                                        EMPLOYEE_SUBCLASSES
+
+EMPLOYEE_PAGE_SIZE = 50
 
 
 def add_employee(job_class='Doctor'):
@@ -58,15 +61,26 @@ def add_employee(job_class='Doctor'):
 
 
 def view_employees():
-    # Retrieve all employees
-    all_employees = retrieve_all_employees(db.get_db())
-    # Organize employees by job class
+    form = EmployeeFilterForm(request.args, meta={'csrf': False})
+    form.validate()
+    job_classes = [form.job_class.data] if form.job_class.data in EMPLOYEE_SUBCLASSES else list(EMPLOYEE_SUBCLASSES)
+    filter_args = {key: value for key, value in request.args.items() if not key.startswith('after_')}
+
+    # One keyset page per job class; each group pages independently via its own after_<job_class> argument
     employees_grouped = {}
-    for emp in all_employees:
-        if emp.job_class.value not in employees_grouped:
-            employees_grouped[emp.job_class.value] = []
-        employees_grouped[emp.job_class.value].append(emp)
-    return render_template('view_employee.html', employees_grouped=employees_grouped)
+    next_pages = {}
+    for job_class in job_classes:
+        employees, next_after = search_employees(db.get_db(), job_class,
+                                                 facility_id=form.facility_id.data if not form.facility_id.errors else None,
+                                                 query=form.q.data,
+                                                 after_empid=request.args.get(f'after_{job_class}', 0, type=int),
+                                                 limit=EMPLOYEE_PAGE_SIZE)
+        if employees:
+            employees_grouped[job_class] = employees
+        if next_after:
+            next_pages[job_class] = {**request.args.to_dict(), f'after_{job_class}': next_after}
+    return render_template('view_employee.html', form=form, employees_grouped=employees_grouped,
+                           next_pages=next_pages, filter_args=filter_args)
 
 def find_job_class(job_class):
     job_class = job_class.split(".")[1]
@@ -1,6 +1,6 @@
 from datetime import datetime
 
-from flask import flash, redirect, url_for, render_template, request, session
+from flask import flash, redirect, url_for, render_template, request, session, abort
 
 from app.forms import OfficeForm, OutpatientSurgeryForm, DailyInvoiceForm
 from app.Database import db
@@ -139,5 +139,9 @@ def revenue_by_facility():
 
 
 def revenue_by_patient(date):
+    try:
+        datetime.strptime(date, '%Y-%m-%d')
+    except ValueError:
+        abort(400)
     revenues, total_revenue = generate_revenue_by_patient(db.get_db(), date)
     return render_template('revenue_by_patient.html', invoice_date=date, revenues=revenues, total_revenue=total_revenue)
\ No newline at end of file
@@ -1,12 +1,15 @@
 import logging
 
-from flask import render_template, flash, url_for, redirect, request
+from flask import render_template, flash, url_for, redirect, request, jsonify
 from icecream import ic
 
 from app.Database import db
 
 from app.forms import PatientForm, AppointmentForm
-from crud_helpers.patient_crud import delete_patient, update_patient, get_patient, get_all_patients, create_patient
+from crud_helpers.patient_crud import delete_patient, update_patient, get_patient, create_patient, \
+    search_patients, list_patients
+
+PATIENT_PAGE_SIZE = 100
 
 
 def add_patient_record():
@@ -33,8 +36,25 @@ def add_patient_record():
 
 
 def view_patient_list():
-    patient_list = get_all_patients(db.get_db())
-    return render_template('patient_view.html', patient_list=patient_list)
+    query = request.args.get('q', '').strip()
+    if query:
+        patient_list = search_patients(db.get_db(), query, limit=PATIENT_PAGE_SIZE)
+        next_after = None
+    else:
+        after_id = request.args.get('after', 0, type=int)
+        patient_list = list_patients(db.get_db(), after_id=after_id, limit=PATIENT_PAGE_SIZE)
+        next_after = patient_list[-1]['patient_id'] if len(patient_list) == PATIENT_PAGE_SIZE else None
+    return render_template('patient_view.html', patient_list=patient_list, query=query, next_after=next_after)
+
+
+def search_patients_api():
+    """
+    Type-ahead lookup: /api/patients/search?q=<prefix> returns matching patients as JSON.
+    """
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 50)
+    patients = search_patients(db.get_db(), request.args.get('q', ''), limit=limit)
+    return jsonify([{'patient_id': patient['patient_id'], 'label': f"{patient['fname']} {patient['lname']}"}
+                    for patient in patients])
 
 
 def edit_patient(patient_id):
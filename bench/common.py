@@ -0,0 +1,53 @@
+"""
+Helpers shared by the benchmarks.
+"""
+from sqlalchemy import text, bindparam
+
+from crud_helpers.availability import availability_cache
+from crud_helpers.daily_revenue import add_detail_revenue
+from crud_helpers.reference_cache import reference_cache
+from crud_helpers.report_cache import report_cache
+
+APPOINTMENT_KEY = """
+    patient_id = :patient_id AND facility_id = :facility_id AND doctor_id = :doctor_id AND date_time = :date_time
+"""
+
+
+def invoice_ids_on(session, day):
+    """
+    Ids of the invoices dated day, taken before a run so cleanup keeps them.
+    """
+    return set(session.execute(text("SELECT invoice_id FROM Invoice WHERE date = :day"), {'day': day}).scalars())
+
+
+def delete_bench_appointments(session, appointments, day, keep_invoice_ids):
+    """
+    Undo the bookings a run made on day and nothing else.
+
+    appointments is a list of dicts with patient_id, facility_id, doctor_id
+    and date_time. Their revenue is taken back out of DailyRevenue and their
+    details are deleted through the invoice total triggers, so rows booked
+    by anyone else that day keep their totals. Invoices dated day that are
+    now empty and not in keep_invoice_ids were made by the run and go too.
+
+    This process's caches are cleared afterwards; a running server drops its
+    entries for day when their TTL runs out.
+    """
+    if appointments:
+        add_detail_revenue(session, appointments, sign=-1)
+        for table_name in ('InvoiceDetails', 'Appointments'):
+            session.execute(text(f"DELETE FROM {table_name} WHERE " + APPOINTMENT_KEY), appointments)
+    session.execute(text("""
+        DELETE FROM Invoice
+        WHERE date = :day AND invoice_id NOT IN :keep_invoice_ids
+          AND invoice_id NOT IN (SELECT invoice_id FROM InvoiceDetails)
+    """).bindparams(bindparam('keep_invoice_ids', expanding=True)),
+        {'day': day, 'keep_invoice_ids': list(keep_invoice_ids)})
+    # Revenue rows the run created are back to zero
+    session.execute(text("""
+        DELETE FROM DailyRevenue WHERE date = :day AND revenue = 0 AND appt_count = 0
+    """), {'day': day})
+    session.commit()
+
+    for cache in (report_cache, availability_cache, reference_cache):
+        cache.clear()
@@ -0,0 +1,117 @@
+"""
+Race N concurrent bookings of one doctor into one slot and check exactly one wins.
+
+Every writer books the same doctor at the same facility and time, each for its
+own insured patient, released together by a barrier. create_appointment must
+let one booking through and reject the others with its double-booking
+ValueError; anything else (two winners, a deadlock, a lock wait timeout) is
+reported and the run exits non-zero.
+
+Needs a populated database (see db_populate.py) with at least --writers insured
+patients. Bookings are made on --day and deleted again afterwards.
+
+    python -m bench.double_booking_race --writers 16 --rounds 20
+"""
+import argparse
+import sys
+import threading
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.Database import db
+from bench.common import delete_bench_appointments, invoice_ids_on
+from crud_helpers.appointment_crud import create_appointment
+from crud_helpers.availability import appointment_duration
+
+
+def race_fixture(session, writers):
+    """
+    Pick a facility, a doctor and `writers` insured patients.
+    """
+    patient_ids = session.execute(text("""
+        SELECT patient_id FROM Patient WHERE insurance_id IS NOT NULL ORDER BY patient_id LIMIT :writers
+    """), {'writers': writers}).scalars().all()
+    doctor_id = session.execute(text("SELECT EMPID FROM Doctor ORDER BY EMPID LIMIT 1")).scalar()
+    facility_id = session.execute(text("SELECT facility_id FROM Facility ORDER BY facility_id LIMIT 1")).scalar()
+    if len(patient_ids) < writers or doctor_id is None or facility_id is None:
+        raise SystemExit(f"Need {writers} insured patients, a doctor and a facility")
+    return facility_id, doctor_id, list(patient_ids)
+
+
+def writer(connection, appointment, outcomes, start_barrier):
+    session = Session(bind=connection)
+    start_barrier.wait()
+    try:
+        create_appointment(session, appointment['patient_id'], appointment['facility_id'],
+                           appointment['doctor_id'], appointment['date_time'], 'bench')
+        outcomes.append(('booked', appointment))
+    except ValueError:
+        outcomes.append(('rejected', appointment))
+    except Exception as e:
+        outcomes.append(('failed', str(e)))
+    finally:
+        session.close()
+
+
+def race(engine, facility_id, doctor_id, patient_ids, slot):
+    """
+    Book slot once per patient, all at the same moment. Returns the outcomes.
+    """
+    connections = [engine.connect() for _ in patient_ids]
+    outcomes = []
+    start_barrier = threading.Barrier(len(patient_ids))
+    threads = [threading.Thread(target=writer, args=(connection, {'patient_id': patient_id, 'facility_id': facility_id,
+                                                                  'doctor_id': doctor_id, 'date_time': slot},
+                                                      outcomes, start_barrier))
+               for connection, patient_id in zip(connections, patient_ids)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    for connection in connections:
+        connection.close()
+    return outcomes
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, default=16)
+    parser.add_argument('--rounds', type=int, default=10, help='Slots raced for, one after another.')
+    parser.add_argument('--day', type=date.fromisoformat, default=date(2099, 1, 2))
+    args = parser.parse_args()
+
+    db.connect()
+    engine = db.get_engine()
+    session = db.get_db()
+    try:
+        facility_id, doctor_id, patient_ids = race_fixture(session, args.writers)
+        keep_invoice_ids = invoice_ids_on(session, args.day)
+        session.rollback()
+
+        first_slot = datetime.combine(args.day, datetime.min.time())
+        if (first_slot + appointment_duration() * (args.rounds - 1)).date() != args.day:
+            raise SystemExit(f"At most {timedelta(days=1) // appointment_duration()} rounds fit in one day")
+        booked, broken = [], 0
+        for index in range(args.rounds):
+            slot = first_slot + appointment_duration() * index
+            outcomes = race(engine, facility_id, doctor_id, patient_ids, slot)
+            winners = [appointment for outcome, appointment in outcomes if outcome == 'booked']
+            failures = [message for outcome, message in outcomes if outcome == 'failed']
+            booked.extend(winners)
+            if len(winners) != 1 or failures:
+                broken += 1
+                print(f"{slot:%H:%M} booked={len(winners)} failed={len(failures)}"
+                      + (f" first error: {failures[0]}" if failures else ""))
+        delete_bench_appointments(session, booked, args.day, keep_invoice_ids)
+    finally:
+        db.remove()
+
+    print(f"writers={args.writers} rounds={args.rounds} broken={broken}")
+    if broken:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""
+Booking throughput of N concurrent writers on one invoice, per invoice_totals_mode.
+
+Every writer books appointments for its own doctor and patient, all on one day
+and all with the same insurer, so every booking lands on the same Invoice row.
+In the trigger mode each booking updates that row's total_cost and the writers
+queue on its lock. In the deferred mode they only append to InvoiceTotalQueue.
+
+Needs a populated database (see db_populate.py) with at least --writers doctors
+and --writers patients of one insurer. Bookings are made on --day, which should
+be free, and are deleted again afterwards.
+
+    python -m bench.invoice_totals_contention --writers 1 4 16 --bookings 40
+"""
+import argparse
+import statistics
+import threading
+import time
+from datetime import date, datetime, timedelta
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+from app.Database import db
+from bench.common import delete_bench_appointments, invoice_ids_on
+from crud_helpers.appointment_crud import create_appointment
+from crud_helpers.availability import appointment_duration
+from crud_helpers.invoice_totals import flush_invoice_totals, pending_invoice_totals
+
+MODES = ('trigger', 'deferred')
+
+
+def bench_fixture(session, writers):
+    """
+    Pick a facility, `writers` doctors and `writers` patients of the insurer with the most patients.
+    """
+    insurance_id = session.execute(text("""
+        SELECT insurance_id FROM Patient WHERE insurance_id IS NOT NULL
+        GROUP BY insurance_id ORDER BY COUNT(*) DESC LIMIT 1
+    """)).scalar()
+    patient_ids = session.execute(text("""
+        SELECT patient_id FROM Patient WHERE insurance_id = :insurance_id ORDER BY patient_id LIMIT :writers
+    """), {'insurance_id': insurance_id, 'writers': writers}).scalars().all()
+    doctor_ids = session.execute(text("SELECT EMPID FROM Doctor ORDER BY EMPID LIMIT :writers"),
+                                 {'writers': writers}).scalars().all()
+    facility_id = session.execute(text("SELECT facility_id FROM Facility ORDER BY facility_id LIMIT 1")).scalar()
+    if len(patient_ids) < writers or len(doctor_ids) < writers or facility_id is None:
+        raise SystemExit(f"Need {writers} doctors, {writers} patients of one insurer and a facility")
+    return facility_id, list(zip(doctor_ids, patient_ids))
+
+
+def writer(connection, mode, facility_id, doctor_id, patient_id, slots, latencies, booked, errors, start_barrier):
+    session = Session(bind=connection)
+    session.execute(text("SET @defer_invoice_totals = " + ('1' if mode == 'deferred' else 'NULL')))
+    session.commit()
+    start_barrier.wait()
+    for slot in slots:
+        started = time.perf_counter()
+        try:
+            create_appointment(session, patient_id, facility_id, doctor_id, slot, 'bench')
+        except Exception as e:
+            errors.append(str(e))
+            continue
+        latencies.append(time.perf_counter() - started)
+        booked.append({'patient_id': patient_id, 'facility_id': facility_id, 'doctor_id': doctor_id,
+                       'date_time': slot})
+    session.close()
+
+
+def run(engine, mode, writers, bookings, day):
+    session = db.get_db()
+    facility_id, pairs = bench_fixture(session, writers)
+    keep_invoice_ids = invoice_ids_on(session, day)
+    session.rollback()
+    duration = appointment_duration()
+    first_slot = datetime.combine(day, datetime.min.time())
+    slots = [first_slot + duration * index for index in range(bookings)]
+    if slots[-1].date() != day:
+        raise SystemExit(f"At most {timedelta(days=1) // duration} bookings per writer fit in one day")
+
+    connections = [engine.connect() for _ in pairs]
+    latencies, booked, errors = [], [], []
+    start_barrier = threading.Barrier(writers + 1)
+    threads = [threading.Thread(target=writer, args=(connection, mode, facility_id, doctor_id, patient_id, slots,
+                                                      latencies, booked, errors, start_barrier))
+               for connection, (doctor_id, patient_id) in zip(connections, pairs)]
+    for thread in threads:
+        thread.start()
+    start_barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    for connection in connections:
+        connection.close()
+
+    queued = pending_invoice_totals(session)
+    session.rollback()
+    flush_started = time.perf_counter()
+    flush_all(engine)
+    flush_elapsed = time.perf_counter() - flush_started
+    delete_bench_appointments(session, booked, day, keep_invoice_ids)
+    # Deleting the details may have queued their invoices again
+    flush_all(engine)
+
+    latencies.sort()
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0.0
+    print(f"{mode:>8} writers={writers:<3} bookings={len(latencies):<5} errors={len(errors):<3} "
+          f"throughput={len(latencies) / elapsed:8.1f}/s "
+          f"median={statistics.median(latencies) * 1000 if latencies else 0.0:7.1f}ms p99={p99 * 1000:7.1f}ms "
+          f"flush={queued} invoice(s) in {flush_elapsed * 1000:.1f}ms")
+    if errors:
+        print(f"         first error: {errors[0]}")
+
+
+def flush_all(engine):
+    # A fresh session, so flush_invoice_totals sets READ COMMITTED before its first statement
+    session = Session(bind=engine)
+    try:
+        while flush_invoice_totals(session):
+            pass
+    finally:
+        session.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--writers', type=int, nargs='+', default=[1, 4, 16])
+    parser.add_argument('--bookings', type=int, default=40, help='Bookings per writer.')
+    parser.add_argument('--day', type=date.fromisoformat, default=date(2099, 1, 1))
+    parser.add_argument('--mode', choices=MODES, nargs='+', default=list(MODES))
+    args = parser.parse_args()
+
+    db.connect()
+    engine = db.get_engine()
+    try:
+        for writers in args.writers:
+            for mode in args.mode:
+                run(engine, mode, writers, args.bookings, args.day)
+    finally:
+        db.remove()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,11 +1,16 @@
 import logging
+from datetime import datetime
 
 from icecream import ic
-from sqlalchemy import text
+from sqlalchemy import text, bindparam
 from sqlalchemy.orm import Session
 from sqlalchemy.exc import SQLAlchemyError
 
-from crud_helpers.insurance_crud import get_insurance_id
+from crud_helpers.availability import availability_cache, ensure_doctor_available
+from crud_helpers.daily_revenue import detail_key, add_detail_revenue, add_detail_cost, add_cost_updates_revenue, \
+    add_new_appointments, generate_top_revenue_days_window
+from crud_helpers.invoice_totals import reconcile_invoice_totals
+from crud_helpers.report_cache import report_cache, cached_report, day_span, month_span
 
 # Setting the logging level for SQLAlchemy engine to display queries
 
@@ -15,20 +20,116 @@ from crud_helpers.insurance_crud import get_insurance_id
 # =========================
 
 def create_appointment(session, patient_id, facility_id, doctor_id, date_time, description):
+    """
+    Book an appointment in a single transaction: check the doctor is free,
+    resolve the insurer's invoice for the day (one upsert), then insert the
+    appointment and its invoice detail. Raises ValueError for a double
+    booking or an uninsured patient.
+    """
     try:
-        insurance_id = get_insurance_id(session, patient_id)
-        if not insurance_id:
+        ensure_doctor_available(session, doctor_id, date_time)
+        invoice_id = upsert_patient_invoice(session, patient_id, date_time.date())
+        if not invoice_id:
             raise ValueError("No insurance found for patient")
-        invoice_date = date_time.date()
-        invoice_id = handle_invoice(session, insurance_id, invoice_date)
         insert_appointment(session, patient_id, facility_id, doctor_id, date_time, description)
         insert_invoice_details(session, invoice_id, patient_id, facility_id, doctor_id, date_time)
+        add_detail_revenue(session, [{'patient_id': patient_id, 'facility_id': facility_id, 'doctor_id': doctor_id,
+                                      'date_time': date_time}])
         session.commit()
+        report_cache.invalidate_dates([date_time])
+        availability_cache.add(doctor_id, facility_id, date_time)
+    except ValueError:
+        session.rollback()
+        raise
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Failed to create appointment: {str(e)}")
 
 
+def create_appointments_bulk(session, rows):
+    """
+    Book many appointments in one transaction.
+
+    rows is an iterable of dicts with patient_id, facility_id, doctor_id,
+    date_time (datetime) and description. Insurers are resolved for all
+    patients with one IN query, every needed (insurer, date) invoice is
+    upserted in one multi-row INSERT and read back in one locking query,
+    and the Appointments and InvoiceDetails rows go in with executemany
+    (PyMySQL rewrites these into multi-row INSERTs as long as the VALUES
+    clause holds only bind parameters).
+
+    Returns (created_count, rejected) where rejected is a list of
+    (row, reason) for rows whose patient has no insurance.
+    """
+    rows = list(rows)
+    if not rows:
+        return 0, []
+    try:
+        patient_ids = {row['patient_id'] for row in rows}
+        insurer_query = text("""
+            SELECT patient_id, insurance_id FROM Patient
+            WHERE patient_id IN :patient_ids AND insurance_id IS NOT NULL
+        """).bindparams(bindparam('patient_ids', expanding=True))
+        insurer_by_patient = {row[0]: row[1] for row in
+                              session.execute(insurer_query, {'patient_ids': list(patient_ids)})}
+
+        accepted, rejected = [], []
+        for row in rows:
+            if row['patient_id'] in insurer_by_patient:
+                accepted.append(row)
+            else:
+                rejected.append((row, "No insurance found for patient"))
+        if not accepted:
+            return 0, rejected
+
+        invoice_keys = {(insurer_by_patient[row['patient_id']], row['date_time'].date()) for row in accepted}
+        session.execute(text("""
+            INSERT INTO Invoice (date, total_cost, insurance_id)
+            VALUES (:invoice_date, :total_cost, :insurance_id)
+            ON DUPLICATE KEY UPDATE invoice_id = invoice_id
+        """), [{'insurance_id': insurance_id, 'invoice_date': invoice_date, 'total_cost': 0}
+               for insurance_id, invoice_date in invoice_keys])
+
+        dates = [invoice_date for _, invoice_date in invoice_keys]
+        # A locking read sees invoices committed by others after this transaction's snapshot,
+        # which the upsert above left untouched
+        invoice_query = text("""
+            SELECT invoice_id, insurance_id, date FROM Invoice
+            WHERE insurance_id IN :insurance_ids AND date BETWEEN :first_date AND :last_date
+            FOR SHARE
+        """).bindparams(bindparam('insurance_ids', expanding=True))
+        invoice_ids = {(row[1], row[2]): row[0] for row in session.execute(invoice_query, {
+            'insurance_ids': list({insurance_id for insurance_id, _ in invoice_keys}),
+            'first_date': min(dates),
+            'last_date': max(dates),
+        })}
+
+        session.execute(text("""
+            INSERT INTO Appointments (patient_id, facility_id, doctor_id, date_time, description)
+            VALUES (:patient_id, :facility_id, :doctor_id, :date_time, :description)
+        """), [{'patient_id': row['patient_id'], 'facility_id': row['facility_id'], 'doctor_id': row['doctor_id'],
+                'date_time': row['date_time'], 'description': row.get('description')} for row in accepted])
+        session.execute(text("""
+            INSERT INTO InvoiceDetails (invoice_id, cost, patient_id, facility_id, doctor_id, date_time)
+            VALUES (:invoice_id, :cost, :patient_id, :facility_id, :doctor_id, :date_time)
+        """), [{'invoice_id': invoice_ids[(insurer_by_patient[row['patient_id']], row['date_time'].date())],
+                'cost': 0, 'patient_id': row['patient_id'], 'facility_id': row['facility_id'], 'doctor_id': row['doctor_id'],
+                'date_time': row['date_time']} for row in accepted])
+        add_new_appointments(session, [(row['date_time'].date(), row['facility_id'], insurer_by_patient[row['patient_id']],
+                                        row['patient_id']) for row in accepted])
+        session.commit()
+        report_cache.invalidate_dates(row['date_time'] for row in accepted)
+        for row in accepted:
+            availability_cache.add(row['doctor_id'], row['facility_id'], row['date_time'])
+        return len(accepted), rejected
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Failed to create appointments: {str(e)}")
+    except Exception:
+        session.rollback()
+        raise
+
+
 def insert_appointment(session, patient_id, facility_id, doctor_id, date_time, description):
     query = text("""
         INSERT INTO Appointments (patient_id, facility_id, doctor_id, date_time, description)
@@ -48,29 +149,44 @@ def insert_invoice_details(session, invoice_id, patient_id, facility_id, doctor_
 
 
 def handle_invoice(session, insurance_id, invoice_date):
-    # First, attempt to find an existing invoice
+    """
+    Return the invoice_id for (insurance_id, invoice_date), creating the invoice
+    if needed. Relies on the unique (insurance_id, date) key: on a duplicate,
+    LAST_INSERT_ID(invoice_id) hands back the existing row's id, so concurrent
+    bookings converge on one invoice without a SELECT or a mid-transaction commit.
+    """
     result = session.execute(text("""
-        SELECT invoice_id FROM Invoice
-        WHERE insurance_id = :insurance_id AND date = :invoice_date
-    """), {'insurance_id': insurance_id, 'invoice_date': invoice_date})
-
-    for row in result:
-        return row[0]  # Return existing invoice_id if found
-
-    # If no existing invoice, create a new one
-    session.execute(text("""
         INSERT INTO Invoice (date, total_cost, insurance_id)
         VALUES (:invoice_date, 0, :insurance_id)
+        ON DUPLICATE KEY UPDATE invoice_id = LAST_INSERT_ID(invoice_id)
     """), {'invoice_date': invoice_date, 'insurance_id': insurance_id})
-    session.commit()
+    return result.lastrowid
 
-    # Retrieve the newly created invoice_id using LAST_INSERT_ID()
-    result = session.execute(text("SELECT LAST_INSERT_ID()"))
-    for row in result:
-        return row[0]  # Return the new invoice_id
 
+def upsert_patient_invoice(session, patient_id, invoice_date):
+    """
+    Same as handle_invoice, but looks up the patient's insurer in the same
+    statement. Returns None if the patient has no insurance.
+
+    An existing invoice is found with a non-locking read first. The upsert
+    locks the Invoice row even when it only returns the existing id, which
+    would make every booking for the insurer and day wait on that row.
+    """
+    invoice_id = session.execute(text("""
+        SELECT i.invoice_id FROM Patient p
+        JOIN Invoice i ON i.insurance_id = p.insurance_id AND i.date = :invoice_date
+        WHERE p.patient_id = :patient_id
+    """), {'invoice_date': invoice_date, 'patient_id': patient_id}).scalar()
+    if invoice_id is not None:
+        return invoice_id
+    result = session.execute(text("""
+        INSERT INTO Invoice (date, total_cost, insurance_id)
+        SELECT :invoice_date, 0, insurance_id FROM Patient
+        WHERE patient_id = :patient_id AND insurance_id IS NOT NULL
+        ON DUPLICATE KEY UPDATE invoice_id = LAST_INSERT_ID(invoice_id)
+    """), {'invoice_date': invoice_date, 'patient_id': patient_id})
+    return result.lastrowid or None
 
-# Return the newly created invoice ID
 
 def ensure_treats_exist(session, patient_id, doctor_id):
     result = session.execute(text("""
@@ -102,20 +218,19 @@ def find_invoice_id(session, insurance_id, new_date):
 
 def get_appointment_by_id(session, patient_id, facility_id, doctor_id, date_time):
     result = session.execute(text("""
-        SELECT * FROM Appointments
+        SELECT patient_id, facility_id, doctor_id, date_time, description FROM Appointments
         WHERE patient_id = :patient_id AND facility_id = :facility_id
         AND doctor_id = :doctor_id AND date_time = :date_time
     """), {'patient_id': patient_id, 'facility_id': facility_id, 'doctor_id': doctor_id, 'date_time': date_time})
     appointment = None
     for row in result:
-        appointment = {'patient_id': row[0], 'doctor_id': row[1], 'facility_id': row[2], 'date_time': row[3],
+        appointment = {'patient_id': row[0], 'facility_id': row[1], 'doctor_id': row[2], 'date_time': row[3],
                        'description': row[4]}
         break  # Since there should only be one record, break after the first iteration
     return appointment
 
 
-def search_appointments_db(session, patient_id=None, doctor_id=None, facility_id=None, start_date=None, end_date=None):
-    query = """
+APPOINTMENT_SEARCH_SELECT = """
         SELECT a.patient_id, a.doctor_id, a.facility_id, a.date_time, id.cost, a.description
         FROM Appointments a
         JOIN InvoiceDetails id ON a.patient_id = id.patient_id
@@ -124,197 +239,270 @@ def search_appointments_db(session, patient_id=None, doctor_id=None, facility_id
                                AND a.date_time = id.date_time
         WHERE 1=1
     """
+
+
+def _appointment_search_filters(patient_id=None, doctor_id=None, facility_id=None, start_date=None, end_date=None):
+    """
+    Build the WHERE conditions and parameters shared by the appointment search queries.
+    """
+    conditions = ""
     params = {}
     if patient_id:
-        query += " AND a.patient_id = :patient_id"
+        conditions += " AND a.patient_id = :patient_id"
         params['patient_id'] = patient_id
     if doctor_id:
-        query += " AND a.doctor_id = :doctor_id"
+        conditions += " AND a.doctor_id = :doctor_id"
         params['doctor_id'] = doctor_id
     if facility_id:
-        query += " AND a.facility_id = :facility_id"
+        conditions += " AND a.facility_id = :facility_id"
         params['facility_id'] = facility_id
     if start_date:
-        query += " AND a.date_time >= :start_date"
+        conditions += " AND a.date_time >= :start_date"
         params['start_date'] = start_date.strftime('%Y-%m-%d')
     if end_date:
-        query += " AND a.date_time <= :end_date"
+        conditions += " AND a.date_time <= :end_date"
         params['end_date'] = end_date.strftime('%Y-%m-%d')
+    return conditions, params
 
-    result = session.execute(text(query), params)
-    return [{'patient_id': row[0], 'doctor_id': row[1], 'facility_id': row[2], 'date_time': row[3], 'cost': row[4],
-             'description': row[5]} for row in result]
+
+def _appointment_row(row):
+    return {'patient_id': row[0], 'doctor_id': row[1], 'facility_id': row[2], 'date_time': row[3], 'cost': row[4],
+            'description': row[5]}
+
+
+def search_appointments_db(session, patient_id=None, doctor_id=None, facility_id=None, start_date=None, end_date=None):
+    conditions, params = _appointment_search_filters(patient_id, doctor_id, facility_id, start_date, end_date)
+    result = session.execute(text(APPOINTMENT_SEARCH_SELECT + conditions), params)
+    return [_appointment_row(row) for row in result]
+
+
+def iter_appointments(session, filters, batch_size=1000):
+    """
+    Yield search_appointments_db rows one at a time from a server-side cursor,
+    fetching batch_size rows per round trip, so memory stays constant however
+    many rows match. The session's connection is busy until the generator is
+    exhausted or closed.
+    """
+    conditions, params = _appointment_search_filters(**filters)
+    conditions += " ORDER BY a.date_time, a.patient_id, a.facility_id, a.doctor_id"
+    result = session.execute(text(APPOINTMENT_SEARCH_SELECT + conditions), params,
+                             execution_options={'stream_results': True})
+    try:
+        for row in result.yield_per(batch_size):
+            yield _appointment_row(row)
+    finally:
+        result.close()
+
+
+def encode_appointment_cursor(appointment):
+    """
+    Encode an appointment's position in the (date_time, patient_id, facility_id,
+    doctor_id) ordering as an opaque page cursor.
+    """
+    return '_'.join([appointment['date_time'].strftime('%Y%m%d%H%M%S'), str(appointment['patient_id']),
+                     str(appointment['facility_id']), str(appointment['doctor_id'])])
+
+
+def decode_appointment_cursor(cursor):
+    """
+    Inverse of encode_appointment_cursor. Raises ValueError on a malformed cursor.
+    """
+    date_time, patient_id, facility_id, doctor_id = cursor.split('_')
+    return {'cursor_date_time': datetime.strptime(date_time, '%Y%m%d%H%M%S'), 'cursor_patient_id': int(patient_id),
+            'cursor_facility_id': int(facility_id), 'cursor_doctor_id': int(doctor_id)}
+
+
+def search_appointments_page(session, filters, after=None, before=None, page_size=50):
+    """
+    Return one page of search_appointments_db results using keyset pagination
+    on (date_time, patient_id, facility_id, doctor_id).
+
+    after/before are cursors from a previous page. Each page is a range
+    scan that starts at the cursor and reads at most page_size + 1 rows, so
+    latency does not grow with the table or with page depth.
+
+    Returns a dict with 'appointments', 'next_cursor' and 'prev_cursor'
+    (None when there is no such page).
+    """
+    conditions, params = _appointment_search_filters(**filters)
+    params['page_limit'] = page_size + 1
+    # Range on date_time first so the index can seek, then the tie-breaker on the rest of the key
+    if before:
+        params.update(decode_appointment_cursor(before))
+        conditions += """ AND a.date_time <= :cursor_date_time
+            AND (a.date_time < :cursor_date_time
+                 OR (a.patient_id, a.facility_id, a.doctor_id) < (:cursor_patient_id, :cursor_facility_id, :cursor_doctor_id))
+            ORDER BY a.date_time DESC, a.patient_id DESC, a.facility_id DESC, a.doctor_id DESC"""
+    else:
+        if after:
+            params.update(decode_appointment_cursor(after))
+            conditions += """ AND a.date_time >= :cursor_date_time
+            AND (a.date_time > :cursor_date_time
+                 OR (a.patient_id, a.facility_id, a.doctor_id) > (:cursor_patient_id, :cursor_facility_id, :cursor_doctor_id))"""
+        conditions += " ORDER BY a.date_time, a.patient_id, a.facility_id, a.doctor_id"
+    conditions += " LIMIT :page_limit"
+
+    appointments = [_appointment_row(row) for row in session.execute(text(APPOINTMENT_SEARCH_SELECT + conditions), params)]
+    has_more = len(appointments) > page_size
+    appointments = appointments[:page_size]
+    if before:
+        appointments.reverse()
+        prev_cursor = encode_appointment_cursor(appointments[0]) if has_more else None
+        next_cursor = encode_appointment_cursor(appointments[-1]) if appointments else None
+    else:
+        next_cursor = encode_appointment_cursor(appointments[-1]) if has_more else None
+        prev_cursor = encode_appointment_cursor(appointments[0]) if after and appointments else None
+    return {'appointments': appointments, 'next_cursor': next_cursor, 'prev_cursor': prev_cursor}
+
+
+def estimate_appointment_count(session, filters, cap=1000):
+    """
+    Count matching appointments, stopping at cap so the count stays cheap on
+    wide searches. A result equal to cap means "cap or more".
+    """
+    conditions, params = _appointment_search_filters(**filters)
+    params['cap'] = cap
+    query = f"SELECT COUNT(*) FROM ({APPOINTMENT_SEARCH_SELECT + conditions} LIMIT :cap) AS capped"
+    return session.execute(text(query), params).scalar()
 
 
 # =========================
 # CRUD operations for Update
 # =========================
-def update_appointment_and_related_details(session, original_data, updated_data):
+def reschedule_appointment(session, original_data, updated_data):
+    """
+    Move an appointment to new (patient, facility, doctor, date_time) values
+    and update its description, in one transaction.
+
+    The original row is locked first, so a stale or mismatched original key
+    is rejected before anything is written. The InvoiceDetails foreign key
+    to Appointments cascades on update (migration 11), so the detail row
+    follows the UPDATE of Appointments without being deleted and reinserted.
+    If the patient or the day changes, the detail is then pointed at that
+    insurer's invoice for the new day. That invoice is resolved with the
+    same upsert as create_appointment, only after the UPDATE has matched
+    the appointment, so a failed reschedule never leaves an empty invoice
+    behind. Either everything is committed or nothing is.
+
+    Raises ValueError if the appointment no longer exists, the doctor is
+    booked at the new time or the patient has no insurance.
+    """
     try:
-        # Start transaction
-        invoice_detail_tuple = None
-        # Check if date_time has changed
-        date_changed = original_data['date_time'] != updated_data['date_time']
-        invoice_id = None
-
-        if date_changed:
-            # Fetch and delete existing InvoiceDetails temporarily to avoid foreign key constraint
-            invoice_detail_result = session.execute(text("""
-                        SELECT invoice_id, cost FROM InvoiceDetails
-                        WHERE patient_id = :patient_id AND facility_id = :facility_id AND doctor_id = :doctor_id AND date_time = :date_time
-                    """), {
-                'patient_id': original_data['patient_id'],
-                'facility_id': original_data['facility_id'],
-                'doctor_id': original_data['doctor_id'],
-                'date_time': original_data['date_time']
-            })
-            if invoice_detail_result:
-                # Convert tuple to dictionary using the column names directly as keys
-                for val in invoice_detail_result:
-                    invoice_detail_tuple = {
-                    'invoice_id': val[0],
-                    'cost': val[1]
-                    }
-            session.execute(text("""
-                DELETE FROM InvoiceDetails
-                WHERE patient_id = :patient_id AND facility_id = :facility_id AND doctor_id = :doctor_id AND date_time = :date_time
-            """), {
-                'patient_id': original_data['patient_id'],
-                'facility_id': original_data['facility_id'],
-                'doctor_id': original_data['doctor_id'],
-                'date_time': original_data['date_time']
-            })
-
-            # Check for or create a new invoice for the updated date_time
-            insurance_id=get_insurance_id(session,updated_data['patient_id'])
-            invoice_id = find_or_create_invoice(session,  insurance_id, updated_data['date_time'].date())
-
-        # Update the Appointments
-        session.execute(text("""
+        original_key, updated_key = detail_key(original_data), detail_key(updated_data)
+        original = session.execute(text("""
+            SELECT 1 FROM Appointments
+            WHERE patient_id = :patient_id AND facility_id = :facility_id
+            AND doctor_id = :doctor_id AND date_time = :date_time
+            FOR UPDATE
+        """), original_key).first()
+        if original is None:
+            raise ValueError("Appointment not found; it may have been changed or deleted")
+
+        if (updated_data['doctor_id'], updated_data['date_time']) != (original_data['doctor_id'],
+                                                                      original_data['date_time']):
+            ignore = original_data['date_time'] if updated_data['doctor_id'] == original_data['doctor_id'] else None
+            ensure_doctor_available(session, updated_data['doctor_id'], updated_data['date_time'], ignore)
+        add_detail_revenue(session, [original_key], sign=-1)
+
+        result = session.execute(text("""
             UPDATE Appointments
             SET patient_id = :patient_id, facility_id = :facility_id, doctor_id = :doctor_id,
                 date_time = :date_time, description = :description
             WHERE patient_id = :original_patient_id AND facility_id = :original_facility_id
             AND doctor_id = :original_doctor_id AND date_time = :original_date_time
         """), {
-            'patient_id': updated_data['patient_id'],
-            'facility_id': updated_data['facility_id'],
-            'doctor_id': updated_data['doctor_id'],
-            'date_time': updated_data['date_time'],
+            **updated_key,
             'description': updated_data['description'],
             'original_patient_id': original_data['patient_id'],
             'original_facility_id': original_data['facility_id'],
             'original_doctor_id': original_data['doctor_id'],
             'original_date_time': original_data['date_time']
         })
-
-        if date_changed and invoice_detail_tuple:
-            # Reinsert updated InvoiceDetails with new invoice_id and date_time
+        # The MySQL dialect reports matched rows, so an unchanged row still counts
+        if result.rowcount != 1:
+            raise ValueError("Appointment not found; it may have been changed or deleted")
+
+        if (updated_data['patient_id'], updated_data['date_time'].date()) != (original_data['patient_id'],
+                                                                               original_data['date_time'].date()):
+            invoice_id = upsert_patient_invoice(session, updated_data['patient_id'], updated_data['date_time'].date())
+            if not invoice_id:
+                raise ValueError("No insurance found for patient")
+            # The cascade already rewrote the key; the update trigger moves the cost between invoice totals
             session.execute(text("""
-                INSERT INTO InvoiceDetails (invoice_id, cost, patient_id, facility_id, doctor_id, date_time)
-                VALUES (:invoice_id, :cost, :patient_id, :facility_id, :doctor_id, :date_time)
-            """), {
-                'invoice_id': invoice_id,
-                'cost': invoice_detail_tuple['cost'],
-                'patient_id': updated_data['patient_id'],
-                'facility_id': updated_data['facility_id'],
-                'doctor_id': updated_data['doctor_id'],
-                'date_time': updated_data['date_time']
-            })
-
-        # Commit the transaction
+                UPDATE InvoiceDetails SET invoice_id = :invoice_id
+                WHERE patient_id = :patient_id AND facility_id = :facility_id
+                AND doctor_id = :doctor_id AND date_time = :date_time AND invoice_id <> :invoice_id
+            """), {**updated_key, 'invoice_id': invoice_id})
+        add_detail_revenue(session, [updated_key])
         session.commit()
-
-    except Exception as e:
-        # Rollback in case of an error
+    except ValueError:
         session.rollback()
-        raise Exception(f"Failed to update appointment and related entities: {str(e)}")
-
+        raise
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Failed to reschedule appointment: {str(e)}")
 
+    report_cache.invalidate_dates([original_data['date_time'], updated_data['date_time']])
+    availability_cache.remove(original_data['doctor_id'], original_data['facility_id'], original_data['date_time'])
+    availability_cache.add(updated_data['doctor_id'], updated_data['facility_id'], updated_data['date_time'])
 
 
+@cached_report(day_span)
 def search_daily_insurance_invoices(session, invoice_date):
     """
-    Search for daily insurance invoices by a specific date, including details for each invoice detail
-    entry, patient information, and associated insurance company name using tuple indices.
+    Summarize the invoices of one day per insurance company, with one grouped query.
 
-    Parameters:
-    - session: SQLAlchemy session for executing the query.
-    - invoice_date: datetime.date object representing the date to search invoices.
-
-    Returns:
-    A structured list of dictionaries each containing detailed invoice and patient information,
-    along with total cost per invoice and details for individual charges, grouped by insurance company and invoice.
+    Returns a list of dicts with insurance_id, insurance_name, invoice_count, patient_count and
+    total_cost, ordered by insurance_id. The detail rows of an insurer are read separately with
+    search_daily_insurer_invoices, so the page can load them on demand.
     """
-    # Define the SQL query with proper grouping and ordering
-    sql_query = text("""
-        SELECT 
-            ic.name,          -- 0: Insurance company name
-            i.invoice_id,     -- 1: Invoice ID
-            i.total_cost,     -- 2: Invoice total cost
-            id.cost,          -- 3: Detail cost
-            p.fname,          -- 4: Patient first name
-            p.lname,          -- 5: Patient last name
-            p.patient_id,     -- 6: Patient ID
-            i.insurance_id    -- 7: Insurance ID
+    result = session.execute(text("""
+        SELECT i.insurance_id, ic.name, COUNT(DISTINCT i.invoice_id), COUNT(*), SUM(id.cost)
         FROM Invoice i
         JOIN InvoiceDetails id ON i.invoice_id = id.invoice_id
-        JOIN Patient p ON id.patient_id = p.patient_id
         JOIN InsuranceCompany ic ON i.insurance_id = ic.insurance_id
-        WHERE DATE(i.date) = :invoice_date
-        ORDER BY ic.insurance_id, i.invoice_id, p.patient_id
-    """)
+        WHERE i.date = :invoice_date
+        GROUP BY i.insurance_id, ic.name
+        ORDER BY i.insurance_id
+    """), {'invoice_date': invoice_date})
+    return [{'insurance_id': row[0], 'insurance_name': row[1], 'invoice_count': row[2], 'patient_count': row[3],
+             'total_cost': float(row[4])} for row in result]
 
-    # Execute the query with the provided date parameter
-    result = session.execute(sql_query, {'invoice_date': invoice_date})
 
-    # Organize results into a nested structure: insurance -> invoices -> patient details
-    invoices_by_insurance = {}
+@cached_report(day_span)
+def search_daily_insurer_invoices(session, invoice_date, insurance_id):
+    """
+    Return the invoices of one insurer on one day as a list of dicts with invoice_id,
+    invoice_total_cost and patient_details, ordered by invoice_id. The rows come ordered by
+    invoice, so each invoice is complete when the next one starts. Invoice totals are summed
+    from the detail rows, so they are exact in the deferred invoice_totals_mode too.
+    """
+    result = session.execute(text("""
+        SELECT
+            i.invoice_id,     -- 0: Invoice ID
+            id.cost,          -- 1: Detail cost
+            p.patient_id,     -- 2: Patient ID
+            p.fname,          -- 3: Patient first name
+            p.lname           -- 4: Patient last name
+        FROM Invoice i
+        JOIN InvoiceDetails id ON i.invoice_id = id.invoice_id
+        JOIN Patient p ON id.patient_id = p.patient_id
+        WHERE i.insurance_id = :insurance_id AND i.date = :invoice_date
+        ORDER BY i.invoice_id, p.patient_id
+    """), {'insurance_id': insurance_id, 'invoice_date': invoice_date})
+
+    invoices = []
     for row in result:
-        insurance_key = (row[7], row[0])  # Insurance ID and name
-        invoice_key = row[1]  # Invoice ID
-
-        if insurance_key not in invoices_by_insurance:
-            invoices_by_insurance[insurance_key] = {
-                'insurance_name': row[0],
-                'invoices': {}
-            }
-
-        if invoice_key not in invoices_by_insurance[insurance_key]['invoices']:
-            invoices_by_insurance[insurance_key]['invoices'][invoice_key] = {
-                'invoice_id': invoice_key,
-                'invoice_total_cost': float(row[2]),
-                'patient_details': []
-            }
-
-        # Append patient details to this invoice
-        invoices_by_insurance[insurance_key]['invoices'][invoice_key]['patient_details'].append({
-            'patient_id': row[6],
-            'patient_fname': row[4],
-            'patient_lname': row[5],
-            'detail_cost': float(row[3])
+        if not invoices or invoices[-1]['invoice_id'] != row[0]:
+            invoices.append({'invoice_id': row[0], 'invoice_total_cost': 0.0, 'patient_details': []})
+        invoices[-1]['invoice_total_cost'] += float(row[1])
+        invoices[-1]['patient_details'].append({
+            'patient_id': row[2],
+            'patient_fname': row[3],
+            'patient_lname': row[4],
+            'detail_cost': float(row[1])
         })
-
-    return invoices_by_insurance
-
-
-def find_or_create_invoice(session, insurance_id, new_date):
-    try:
-        invoice_id = find_invoice_id(session, insurance_id, new_date)
-        if not invoice_id:
-            # Create a new invoice if it doesn't exist
-            session.execute(text("""
-                INSERT INTO Invoice (date, total_cost, insurance_id)
-                VALUES (:date, 0, :insurance_id)
-            """), {'date': new_date, 'insurance_id': insurance_id})
-            session.commit()
-            invoice_id = find_invoice_id(session, insurance_id, new_date)
-        return invoice_id
-    except Exception as e:
-
-        session.rollback()
-        raise Exception(f"Failed to update appointment and related entities: {str(e)}")
-
+    return invoices
 
 
 def update_invoice_details_date(session, updated_data):
@@ -341,6 +529,8 @@ def update_invoice_details_date(session, updated_data):
 
 def update_appointment_cost_db(session, patient_id, facility_id, doctor_id, date_time, new_cost):
     try:
+        key = {'patient_id': patient_id, 'facility_id': facility_id, 'doctor_id': doctor_id, 'date_time': date_time}
+        add_detail_cost(session, [key], sign=-1)
         update_invoice_details = text("""
             UPDATE InvoiceDetails
             SET cost = :new_cost
@@ -355,15 +545,89 @@ def update_appointment_cost_db(session, patient_id, facility_id, doctor_id, date
             'date_time': date_time
         })
         print(f"Rows affected in InvoiceDetails: {result.rowcount}")  # Debugging line
-
+        add_detail_cost(session, [key])
 
         session.commit()
+        report_cache.invalidate_dates([date_time])
     except Exception as e:
         session.rollback()
         print(f"Error during database operation: {str(e)}")
         raise
 
 
+def update_appointment_costs_bulk(session, updates):
+    """
+    Apply many appointment cost edits in one transaction.
+
+    updates is an iterable of dicts with patient_id, facility_id, doctor_id,
+    date_time and cost. The edits are loaded into a temporary table with one
+    batched INSERT and applied with a single UPDATE ... JOIN. The per-row
+    total_cost triggers are skipped, and each affected Invoice total is
+    recomputed once afterwards. DailyRevenue is adjusted with one grouped
+    statement before and after the UPDATE.
+
+    Returns the number of InvoiceDetails rows changed.
+    """
+    updates = [{'patient_id': update['patient_id'], 'facility_id': update['facility_id'],
+                'doctor_id': update['doctor_id'], 'date_time': update['date_time'], 'cost': update['cost']}
+               for update in updates]
+    if not updates:
+        return 0
+    try:
+        session.execute(text("SET @skip_invoice_total_trigger = 1"))
+        session.execute(text("DROP TEMPORARY TABLE IF EXISTS cost_updates"))
+        session.execute(text("""
+            CREATE TEMPORARY TABLE cost_updates (
+                patient_id INT NOT NULL,
+                facility_id INT NOT NULL,
+                doctor_id INT NOT NULL,
+                date_time DATETIME NOT NULL,
+                cost DECIMAL(10, 2),
+                PRIMARY KEY (patient_id, facility_id, doctor_id, date_time)
+            )
+        """))
+        session.execute(text("""
+            INSERT INTO cost_updates (patient_id, facility_id, doctor_id, date_time, cost)
+            VALUES (:patient_id, :facility_id, :doctor_id, :date_time, :cost)
+            ON DUPLICATE KEY UPDATE cost = VALUES(cost)
+        """), updates)
+        add_cost_updates_revenue(session, sign=-1)
+        result = session.execute(text("""
+            UPDATE InvoiceDetails id
+            JOIN cost_updates u ON id.patient_id = u.patient_id AND id.facility_id = u.facility_id
+                                AND id.doctor_id = u.doctor_id AND id.date_time = u.date_time
+            SET id.cost = u.cost
+        """))
+        updated = result.rowcount
+        add_cost_updates_revenue(session)
+        session.execute(text("""
+            UPDATE Invoice i
+            JOIN (
+                SELECT d.invoice_id, COALESCE(SUM(d.cost), 0) AS total
+                FROM InvoiceDetails d
+                WHERE d.invoice_id IN (
+                    SELECT id.invoice_id FROM InvoiceDetails id
+                    JOIN cost_updates u ON id.patient_id = u.patient_id AND id.facility_id = u.facility_id
+                                        AND id.doctor_id = u.doctor_id AND id.date_time = u.date_time
+                )
+                GROUP BY d.invoice_id
+            ) totals ON i.invoice_id = totals.invoice_id
+            SET i.total_cost = totals.total
+        """))
+        session.execute(text("DROP TEMPORARY TABLE cost_updates"))
+        # Reset before commit: the connection goes back to the pool when the transaction ends
+        session.execute(text("SET @skip_invoice_total_trigger = NULL"))
+        session.commit()
+        report_cache.invalidate_dates(update['date_time'] for update in updates)
+        return updated
+    except SQLAlchemyError as e:
+        try:
+            session.execute(text("SET @skip_invoice_total_trigger = NULL"))
+        finally:
+            session.rollback()
+        raise Exception(f"Failed to update appointment costs: {str(e)}")
+
+
 def update_invoice_details(session, new_invoice_id, patient_id, facility_id, doctor_id, new_date_time,
                            original_date_time):
     try:
@@ -382,59 +646,19 @@ def update_invoice_details(session, new_invoice_id, patient_id, facility_id, doc
             'original_date_time': original_date_time
         })
         session.commit()
+        report_cache.invalidate_dates([new_date_time, original_date_time])
     except Exception as e:
         session.rollback()
         print(f"Error during database operation: {str(e)}")
         raise
 
 def update_total_cost(session):
-    try:
-        update_total_cost = text("""
-            UPDATE Invoice AS i
-            SET i.total_cost = (SELECT SUM(id.cost) FROM InvoiceDetails AS id
-                WHERE id.invoice_id = i.invoice_id
-            )
-            WHERE EXISTS (
-                SELECT * FROM InvoiceDetails AS id
-                WHERE id.invoice_id = i.invoice_id
-            );""")
-    except Exception as e:
-        session.rollback()
-        print(f"Error during total cost update: {str(e)}")
-        raise
+    """
+    Recompute every Invoice.total_cost from its InvoiceDetails, one primary-key
+    chunk per transaction. Returns the number of invoices corrected.
+    """
+    return sum(len(drift) for _, drift in reconcile_invoice_totals(session, fix=True))
 
 def generate_top_revenue_days(session, year, month):
-    revenue_query = text("""
-            SELECT DATE(Invoice.date) AS revenue_date, SUM(Invoice.total_cost) AS total_revenue
-            FROM Invoice
-            WHERE YEAR(Invoice.date) = :year AND MONTH(Invoice.date) = :month
-            GROUP BY DATE(Invoice.date)
-            ORDER BY total_revenue DESC
-            LIMIT 5;
-        """)
-    revenue_data = session.execute(revenue_query, {'year': year, 'month': month})
-    result_list = []
-    for revenue_entry in revenue_data:
-        result_list.append({
-                    'revenue_date': revenue_entry[0],
-                    'total_revenue': revenue_entry[1],
-                })
-    return result_list
-
-def generate_average_revenue_list(session, begin_date, end_date):
-    revenue_query = text("""
-            SELECT InsuranceCompany.name, AVG(Invoice.total_cost) AS avg_daily_revenue
-            FROM Invoice
-            JOIN InsuranceCompany ON Invoice.insurance_id = InsuranceCompany.insurance_id
-            WHERE Invoice.date BETWEEN :begin_date AND :end_date
-            GROUP BY InsuranceCompany.name;
-        """)
-    revenue_data = session.execute(revenue_query, {'begin_date': begin_date, 'end_date': end_date})
-    result_list = []
-    for revenue_entry in revenue_data:
-        result_list.append({
-                    'insurance_company': revenue_entry[0],
-                    'average_revenue': int(revenue_entry[1]),
-                })
-    print("\n\n", result_list, "\n\n")
-    return result_list
\ No newline at end of file
+    month_start, month_end = month_span(year, month)
+    return generate_top_revenue_days_window(session, month_start, month_end, 5)
@@ -0,0 +1,169 @@
+import bisect
+from datetime import datetime, timedelta
+from itertools import chain, islice
+
+from sqlalchemy import text
+
+from app.settings import settings
+from crud_helpers.ttl_cache import TTLCache
+
+# Whose calendar to read -> Appointments column (both have a (column, date_time) index)
+AVAILABILITY_COLUMNS = {'doctor': 'doctor_id', 'facility': 'facility_id'}
+
+
+def appointment_duration():
+    # Appointments have no end time; every booking blocks this long
+    return timedelta(minutes=settings.appointment_duration_minutes)
+
+
+class AvailabilityCache:
+    """
+    In-process cache of the sorted appointment start times of one doctor or
+    facility on one day, keyed by (kind, owner_id, day).
+
+    Missing days are loaded together with one range query. Bookings made
+    through crud_helpers update the cached days in place with add() and
+    remove().
+    """
+
+    def __init__(self, max_entries, ttl):
+        self._cache = TTLCache(max_entries, ttl)
+
+    def get_days(self, session, kind, owner_id, first_day, last_day):
+        """
+        Return {day: tuple of appointment start times} for every day in
+        [first_day, last_day].
+        """
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        found, missing, generation = self._cache.lookup([(kind, owner_id, day) for day in days])
+        starts_by_day = {day: starts for (_, _, day), starts in found.items()}
+        if not missing:
+            return starts_by_day
+
+        missing_days = [day for _, _, day in missing]
+        loaded = {day: [] for day in missing_days}
+        result = session.execute(text(f"""
+            SELECT date_time FROM Appointments
+            WHERE {AVAILABILITY_COLUMNS[kind]} = :owner_id AND date_time >= :range_start AND date_time < :range_end
+            ORDER BY date_time
+        """), {'owner_id': owner_id, 'range_start': datetime.combine(missing_days[0], datetime.min.time()),
+               'range_end': datetime.combine(missing_days[-1] + timedelta(days=1), datetime.min.time())})
+        for (date_time,) in result:
+            if date_time.date() in loaded:
+                loaded[date_time.date()].append(date_time)
+
+        loaded = {day: tuple(starts) for day, starts in loaded.items()}
+        self._cache.store({(kind, owner_id, day): starts for day, starts in loaded.items()}, generation)
+        starts_by_day.update(loaded)
+        return starts_by_day
+
+    def add(self, doctor_id, facility_id, date_time):
+        def insert(starts):
+            index = bisect.bisect_left(starts, date_time)
+            return starts[:index] + (date_time,) + starts[index:]
+        self._update(doctor_id, facility_id, date_time, insert)
+
+    def remove(self, doctor_id, facility_id, date_time):
+        def discard(starts):
+            index = bisect.bisect_left(starts, date_time)
+            if index < len(starts) and starts[index] == date_time:
+                return starts[:index] + starts[index + 1:]
+            return starts
+        self._update(doctor_id, facility_id, date_time, discard)
+
+    def _update(self, doctor_id, facility_id, date_time, apply):
+        self._cache.update([('doctor', doctor_id, date_time.date()), ('facility', facility_id, date_time.date())],
+                           apply)
+
+    def clear(self):
+        self._cache.clear()
+
+
+availability_cache = AvailabilityCache(settings.availability_cache_max_entries, settings.availability_cache_ttl)
+
+
+def merge_busy(starts, duration):
+    """
+    Merge sorted appointment start times into non-overlapping (start, end)
+    busy intervals.
+    """
+    intervals = []
+    for start in starts:
+        end = start + duration
+        if intervals and start <= intervals[-1][1]:
+            intervals[-1] = (intervals[-1][0], max(intervals[-1][1], end))
+        else:
+            intervals.append((start, end))
+    return intervals
+
+
+def busy_intervals(session, kind, owner_id, first_day, last_day):
+    """
+    Merged busy intervals of a doctor or facility over [first_day, last_day].
+    """
+    starts_by_day = availability_cache.get_days(session, kind, owner_id, first_day, last_day)
+    starts = [start for day in sorted(starts_by_day) for start in starts_by_day[day]]
+    return merge_busy(starts, appointment_duration())
+
+
+def find_free_slots(session, kind, owner_id, start, count=5, length=None, horizon_days=14):
+    """
+    Return up to count free (start, end) slots of the given length (default:
+    the appointment duration) for a doctor or facility. The search starts at
+    start and runs within opening hours for at most horizon_days days.
+    """
+    length = length or appointment_duration()
+    if start.second or start.microsecond:
+        start = start.replace(second=0, microsecond=0) + timedelta(minutes=1)
+    last_day = start.date() + timedelta(days=horizon_days - 1)
+    # A booking just before midnight can reach into the next day, so read one day back
+    busy = busy_intervals(session, kind, owner_id, start.date() - timedelta(days=1), last_day)
+
+    slots = []
+    day = start.date()
+    while day <= last_day and len(slots) < count:
+        opens = datetime.combine(day, datetime.min.time()) + timedelta(hours=settings.clinic_open_hour)
+        closes = datetime.combine(day, datetime.min.time()) + timedelta(hours=settings.clinic_close_hour)
+        cursor = max(opens, start)
+        # Skip intervals that ended before the cursor
+        index = bisect.bisect_right(busy, (cursor,))
+        if index and busy[index - 1][1] > cursor:
+            index -= 1
+        for busy_start, busy_end in chain(islice(busy, index, None), [(closes, closes)]):
+            free_until = min(busy_start, closes)
+            while cursor + length <= free_until and len(slots) < count:
+                slots.append((cursor, cursor + length))
+                cursor += length
+            cursor = max(cursor, busy_end)
+            if cursor >= closes or len(slots) >= count:
+                break
+        day += timedelta(days=1)
+    return slots
+
+
+def ensure_doctor_available(session, doctor_id, date_time, ignore_date_time=None):
+    """
+    Raise ValueError if the doctor has an appointment overlapping
+    [date_time, date_time + duration), other than the one at
+    ignore_date_time (the appointment being rescheduled).
+
+    The doctor's row is locked first, so bookings for the same doctor run
+    one at a time until the holder commits. The next booking then sees the
+    committed appointment and is rejected with the ValueError. Without the
+    row lock, two bookings into an empty window would both take compatible
+    gap locks and then deadlock on their INSERTs.
+    """
+    session.execute(text("SELECT EMPID FROM Doctor WHERE EMPID = :doctor_id FOR UPDATE"),
+                    {'doctor_id': doctor_id})
+    duration = appointment_duration()
+    conflict = session.execute(text("""
+        SELECT date_time FROM Appointments
+        WHERE doctor_id = :doctor_id AND date_time > :window_start AND date_time < :window_end
+          AND NOT (date_time <=> :ignore_date_time)
+        ORDER BY date_time
+        LIMIT 1
+        FOR UPDATE
+    """), {'doctor_id': doctor_id, 'window_start': date_time - duration, 'window_end': date_time + duration,
+           'ignore_date_time': ignore_date_time}).scalar()
+    if conflict is not None:
+        raise ValueError(f"Doctor is already booked at {conflict:%Y-%m-%d %H:%M}")
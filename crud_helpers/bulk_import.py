@@ -0,0 +1,174 @@
+import csv
+import json
+import logging
+from itertools import islice
+
+from sqlalchemy import insert, table, column
+from sqlalchemy.exc import SQLAlchemyError
+
+from app.schemas import Office, OutpatientSurgery, InsuranceCompany, Patient
+from crud_helpers.employee_crud import EMPLOYEE_SUBCLASSES
+from crud_helpers.reference_cache import reference_cache, PATIENTS, DOCTORS, FACILITIES, INSURANCE_COMPANIES
+
+EMPLOYEE_COLUMNS = ['SSN', 'fname', 'lname', 'salary', 'hire_date', 'job_class', 'address', 'facility_id']
+FACILITY_COLUMNS = ['address', 'size', 'ftype']
+# ftype -> (subtype table, subtype columns, model)
+FACILITY_SUBTYPES = {
+    'Office': ('Office', ['office_count'], Office),
+    'OutpatientSurgery': ('OutpatientSurgery', ['room_count', 'description', 'p_code'], OutpatientSurgery),
+}
+PATIENT_COLUMNS = ['fname', 'lname', 'primary_doc_id', 'insurance_id']
+INSURANCE_COLUMNS = ['name', 'address']
+
+
+def read_csv_batches(path, batch_size):
+    """
+    Stream a CSV file as lists of at most batch_size row dicts, so files of any
+    size are imported with bounded memory.
+    """
+    with open(path, newline='') as csv_file:
+        reader = csv.DictReader(csv_file)
+        while True:
+            batch = list(islice(reader, batch_size))
+            if not batch:
+                return
+            yield batch
+
+
+def multi_row_insert(session, table_name, columns, rows):
+    """
+    Insert rows (dicts keyed by column name) with a single multi-row INSERT
+    and return the id generated for the first row.
+
+    The ids of the other rows are mapped by position (first_id + index).
+    This relies on InnoDB giving a "simple insert" (a multi-row
+    INSERT ... VALUES whose row count is known up front) one consecutive
+    block of auto-increment values.
+    """
+    target = table(table_name, *[column(name) for name in columns])
+    result = session.execute(insert(target).values([{name: row[name] for name in columns} for row in rows]))
+    if result.rowcount != len(rows):
+        raise SQLAlchemyError(f"Expected {len(rows)} rows inserted into {table_name}, got {result.rowcount}")
+    return result.lastrowid
+
+
+def _clean_row(row):
+    # Blank CSV cells are treated as missing values
+    return {key.strip(): value.strip() for key, value in row.items()
+            if key and value is not None and value.strip() != ''}
+
+
+# =========================
+# Row validation
+# =========================
+def validate_employee(row):
+    subclass = EMPLOYEE_SUBCLASSES.get(row.get('job_class'))
+    if subclass is None:
+        raise ValueError(f"Unknown job_class {row.get('job_class')!r}")
+    return subclass[2].model_validate(row)
+
+
+def validate_facility(row):
+    subtype = FACILITY_SUBTYPES.get(row.get('ftype'))
+    if subtype is None:
+        raise ValueError(f"Unknown ftype {row.get('ftype')!r}")
+    return subtype[2].model_validate(row)
+
+
+# =========================
+# Batch inserts
+# =========================
+def insert_employees(session, employees):
+    first_id = multi_row_insert(session, 'Employee', EMPLOYEE_COLUMNS, [
+        {'SSN': employee.ssn, 'fname': employee.fname, 'lname': employee.lname, 'salary': employee.salary,
+         'hire_date': employee.hire_date, 'job_class': employee.job_class.value, 'address': employee.address,
+         'facility_id': employee.facility_id} for employee in employees])
+    for offset, employee in enumerate(employees):
+        employee.empid = first_id + offset
+
+    for job_class, (table_name, columns, _) in EMPLOYEE_SUBCLASSES.items():
+        rows = [{'EMPID': employee.empid, **employee.model_dump(include=set(columns))}
+                for employee in employees if employee.job_class.value == job_class]
+        if rows:
+            multi_row_insert(session, table_name, ['EMPID'] + columns, rows)
+
+
+def insert_facilities(session, facilities):
+    first_id = multi_row_insert(session, 'Facility', FACILITY_COLUMNS,
+                                [facility.model_dump(include=set(FACILITY_COLUMNS)) for facility in facilities])
+    for offset, facility in enumerate(facilities):
+        facility.facility_id = first_id + offset
+
+    for ftype, (table_name, columns, _) in FACILITY_SUBTYPES.items():
+        rows = [facility.model_dump(include={'facility_id', *columns})
+                for facility in facilities if facility.ftype == ftype]
+        if rows:
+            multi_row_insert(session, table_name, ['facility_id'] + columns, rows)
+
+
+def insert_patients(session, patients):
+    multi_row_insert(session, 'Patient', PATIENT_COLUMNS,
+                     [patient.model_dump(include=set(PATIENT_COLUMNS)) for patient in patients])
+
+
+def insert_insurance_companies(session, companies):
+    multi_row_insert(session, 'InsuranceCompany', INSURANCE_COLUMNS,
+                     [company.model_dump(include=set(INSURANCE_COLUMNS)) for company in companies])
+
+
+# entity -> (row validator, batch inserter, reference cache entity)
+IMPORTERS = {
+    'employees': (validate_employee, insert_employees, DOCTORS),
+    'facilities': (validate_facility, insert_facilities, FACILITIES),
+    'patients': (Patient.model_validate, insert_patients, PATIENTS),
+    'insurers': (InsuranceCompany.model_validate, insert_insurance_companies, INSURANCE_COMPANIES),
+}
+
+
+def import_csv(session, entity, path, batch_size=500, error_path=None):
+    """
+    Stream a CSV of employees, facilities, patients or insurers into the database.
+
+    Rows are validated with the pydantic schemas in app.schemas. Each batch
+    of valid rows is written in its own transaction: one multi-row INSERT
+    into the parent table, then one per subclass table. Rejected rows, and
+    every row of a batch the database refused, are written to an error
+    report CSV (default: <path>.errors.csv) with their record number and
+    reason.
+
+    Returns (imported, failed, error_path).
+    """
+    validate, insert_batch, cache_entity = IMPORTERS[entity]
+    error_path = error_path or f"{path}.errors.csv"
+    imported, failed, record = 0, 0, 0
+
+    with open(error_path, 'w', newline='') as error_file:
+        errors = csv.writer(error_file)
+        errors.writerow(['record', 'error', 'row'])
+        for batch in read_csv_batches(path, batch_size):
+            valid = []
+            for row in batch:
+                record += 1
+                try:
+                    valid.append((record, validate(_clean_row(row))))
+                except ValueError as e:
+                    errors.writerow([record, str(e).replace('\n', ' '), json.dumps(row)])
+                    failed += 1
+            if not valid:
+                continue
+
+            try:
+                insert_batch(session, [model for _, model in valid])
+                session.commit()
+                imported += len(valid)
+            except SQLAlchemyError as e:
+                session.rollback()
+                logging.warning(f"Import batch ending at record {record} failed: {e}")
+                reason = f"Batch rejected by database: {getattr(e, 'orig', e)}"
+                for row_record, model in valid:
+                    errors.writerow([row_record, reason, model.model_dump_json()])
+                failed += len(valid)
+
+    if imported:
+        reference_cache.invalidate(cache_entity)
+    return imported, failed, error_path
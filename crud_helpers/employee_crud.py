@@ -7,6 +7,9 @@ from sqlalchemy.orm import Session
 
 from sqlalchemy.exc import SQLAlchemyError
 
+from crud_helpers.patient_crud import escape_like
+from crud_helpers.reference_cache import reference_cache, DOCTORS
+
 
 from app.schemas import EmployeeModel, JobClass, Doctor, Nurse, Admin, OtherHCP, OutpatientSurgery, Facility, Office, \
     InsuranceCompany
@@ -91,6 +94,7 @@ def create_employee(session, employee_data, subclass_data):
         subclass_data['empid'] = empid  # Include the EMPID in subclass data for insertion
         session.execute(subclass_insert, subclass_data)
         session.commit()
+        reference_cache.invalidate(DOCTORS)
 
         return empid
 
@@ -106,55 +110,76 @@ def create_employee(session, employee_data, subclass_data):
 # CRUD operations for Retrieve
 # =========================
 
-def retrieve_all_employees(session):
+def employee_data_from_row(emp):
+    """
+    Map the leading Employee columns (EMPID, SSN, fname, lname, salary,
+    hire_date, job_class, address, facility_id) of a row to model fields.
+    """
+    return {
+        'empid': emp[0],  # EMPID
+        'ssn': emp[1],  # SSN
+        'fname': emp[2],  # First Name
+        'lname': emp[3],  # Last Name
+        'salary': float(emp[4]),  # Salary
+        'hire_date': emp[5],  # Hire Date
+        'job_class': JobClass(emp[6]),  # Job Class
+        'address': emp[7],  # Address
+        'facility_id': emp[8]  # Facility ID
+    }
+
+
+# job_class -> (subclass table, subclass columns, model)
+EMPLOYEE_SUBCLASSES = {
+    JobClass.doctor.value: ('Doctor', ['speciality', 'bc_date'], Doctor),
+    JobClass.nurse.value: ('Nurse', ['certification'], Nurse),
+    JobClass.admin.value: ('Admin', ['job_title'], Admin),
+    JobClass.otherhcp.value: ('OtherHCP', ['job_title'], OtherHCP),
+}
+
+
+def search_employees(session, job_class, facility_id=None, query=None, after_empid=0, limit=50):
+    """
+    Return one page of a job_class group, keyset-paginated on EMPID.
+
+    Optional filters: facility_id, and query, which is an exact SSN when
+    numeric and a first/last name prefix otherwise. Each page reads at most
+    limit + 1 rows from the (job_class, ...) and name indexes, so latency does
+    not depend on headcount.
+
+    Returns (employees, next_after_empid); next_after_empid is None on the last page.
+    """
+    table, columns, model = EMPLOYEE_SUBCLASSES[job_class]
+    conditions = "e.job_class = :job_class AND e.EMPID > :after_empid"
+    params = {'job_class': job_class, 'after_empid': after_empid, 'page_limit': limit + 1}
+    if facility_id:
+        conditions += " AND e.facility_id = :facility_id"
+        params['facility_id'] = facility_id
+    query = (query or '').strip()
+    if query.isdigit():
+        conditions += " AND e.SSN = :ssn"
+        params['ssn'] = int(query)
+    elif query:
+        conditions += " AND (e.lname LIKE :prefix OR e.fname LIKE :prefix)"
+        params['prefix'] = escape_like(query) + '%'
+    subclass_columns = ', '.join(f"s.{column}" for column in columns)
     try:
-        employee_query = text("""
-            SELECT EMPID, SSN, fname, lname, salary, hire_date, job_class, address, facility_id
-            FROM Employee;
+        employee_query = text(f"""
+            SELECT e.EMPID, e.SSN, e.fname, e.lname, e.salary, e.hire_date, e.job_class, e.address, e.facility_id,
+                   {subclass_columns}
+            FROM Employee e
+            JOIN {table} s ON s.EMPID = e.EMPID
+            WHERE {conditions}
+            ORDER BY e.EMPID
+            LIMIT :page_limit;
         """)
-        employee_result = session.execute(employee_query)
-
-        result_list = []
-
-        # Process each row as a tuple
-        for emp in employee_result:
-            emp_data = {
-                'empid': emp[0],  # EMPID
-                'ssn': emp[1],  # SSN
-                'fname': emp[2],  # First Name
-                'lname': emp[3],  # Last Name
-                'salary': float(emp[4]),  # Salary
-                'hire_date': emp[5],  # Hire Date
-                'job_class': emp[6],  # Job Class
-                'address': emp[7],  # Address
-                'facility_id': emp[8]  # Facility ID
-            }
-
-            if emp[6] == JobClass.doctor.value:
-                doctor_query = text("SELECT speciality, bc_date FROM Doctor WHERE EMPID = :empid")
-                for doctor in session.execute(doctor_query, {'empid': emp[0]}):
-                    result_list.append(Doctor(speciality=doctor[0], bc_date=doctor[1], **emp_data))
-
-            elif emp[6] == JobClass.nurse.value:
-                nurse_query = text("SELECT certification FROM Nurse WHERE EMPID = :empid")
-                for nurse in session.execute(nurse_query, {'empid': emp[0]}):
-                    result_list.append(Nurse(certification=nurse[0], **emp_data))
-
-            elif emp[6] == JobClass.admin.value:
-                admin_query = text("SELECT job_title FROM Admin WHERE EMPID = :empid")
-                for admin in session.execute(admin_query, {'empid': emp[0]}):
-                    result_list.append(Admin(job_title=admin[0], **emp_data))
-
-            elif emp[6] == JobClass.otherhcp.value:
-                otherhcp_query = text("SELECT job_title FROM OtherHCP WHERE EMPID = :empid")
-                for otherhcp in session.execute(otherhcp_query, {'empid': emp[0]}):
-                    result_list.append(OtherHCP(job_title=otherhcp[0], **emp_data))
-
-        return result_list
-
+        employees = [model.model_construct(**employee_data_from_row(row), **dict(zip(columns, row[9:])))
+                     for row in session.execute(employee_query, params)]
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Database operation failed: {str(e)}")
+    if len(employees) > limit:
+        return employees[:limit], employees[limit - 1].empid
+    return employees, None
 
 def get_all_doctors(session):
     try:
@@ -218,6 +243,7 @@ def update_employee_entry(session, employee_id, job_class, employee_data, subcla
     """)
         session.execute(update_query, subclass_data)
     session.commit()
+    reference_cache.invalidate(DOCTORS)
     return
 # =========================
 # CRUD operations for Delete
@@ -254,6 +280,7 @@ def delete_employee_entry(session, employee_id, job_class):
 
 
         session.commit()
+        reference_cache.invalidate(DOCTORS)
         print("\n\nDeletion Progress is here\n\n", employee_delete_query)
     except SQLAlchemyError as e:
         session.rollback()
@@ -1,4 +1,5 @@
 import logging
+from itertools import groupby
 from typing import Union, List
 
 from icecream import ic
@@ -7,7 +8,11 @@ from sqlalchemy.orm import Session
 
 from sqlalchemy.exc import SQLAlchemyError
 
+from crud_helpers.reference_cache import reference_cache, FACILITIES
+from crud_helpers.report_cache import report_cache, cached_report, day_span, range_span
 
+
+from app.utils.common import revenue_day
 from app.schemas import EmployeeModel, JobClass, Doctor, Nurse, Admin, OtherHCP, OutpatientSurgery, Facility, Office, \
     InsuranceCompany
 
@@ -79,6 +84,7 @@ def create_facility(session, facility_data, subtype_data):
             raise ValueError("Invalid facility type")
 
         session.commit()
+        reference_cache.invalidate(FACILITIES)
 
     except SQLAlchemyError as e:
         session.rollback()  # Roll back the transaction on error
@@ -168,6 +174,8 @@ def update_facility_entry(session, facility_id, facility_data, subtype_data):
             """)
             session.execute(update_query, subtype_data)
         session.commit()
+        reference_cache.invalidate(FACILITIES)
+        report_cache.clear()
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Failed to update patient: {str(e)}")
@@ -193,6 +201,8 @@ def delete_facility_entry(session, facility_id, subclass):
         """)
         session.execute(employee_delete_query, {'facility_id': facility_id})
         session.commit()
+        reference_cache.invalidate(FACILITIES)
+        report_cache.clear()
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Database operation failed: {str(e)}")
@@ -201,19 +211,16 @@ def delete_facility_entry(session, facility_id, subclass):
 # ==========================
 # Generate Revenue By Date
 # ==========================
+@cached_report(day_span)
 def generate_revenue_by_date(session, date):
     revenue_query = text("""
-            SELECT Facility.facility_id, Facility.ftype, Facility.address, SUM(InvoiceDetails.cost) AS daily_revenue
-            FROM Facility
-            JOIN Appointments ON Facility.facility_id = Appointments.facility_id
-            JOIN InvoiceDetails ON Appointments.patient_id = InvoiceDetails.patient_id 
-                                AND Appointments.facility_id = InvoiceDetails.facility_id 
-                                AND Appointments.doctor_id = InvoiceDetails.doctor_id 
-                                AND Appointments.date_time = InvoiceDetails.date_time
-            WHERE DATE(InvoiceDetails.date_time) = :date
+            SELECT Facility.facility_id, Facility.ftype, Facility.address, SUM(DailyRevenue.revenue) AS daily_revenue
+            FROM DailyRevenue
+            JOIN Facility ON DailyRevenue.facility_id = Facility.facility_id
+            WHERE DailyRevenue.date = :revenue_date
             GROUP BY Facility.facility_id;
         """)
-    revenue_data = session.execute(revenue_query, {'date': date})
+    revenue_data = session.execute(revenue_query, {'revenue_date': revenue_day(date)})
     result_list = []
     for revenue_entry in revenue_data:
         result_list.append({
@@ -222,75 +229,66 @@ def generate_revenue_by_date(session, date):
                     'address': revenue_entry[2],
                     'daily_revenue': revenue_entry[3]
                 })
-    total_revenue_query = text("""
-            SELECT SUM(id.cost) AS total_revenue
-            FROM InvoiceDetails AS id
-            WHERE DATE(id.date_time) = :date;
-        """)
-    total_revenue = session.execute(total_revenue_query, {'date': date})
-    for revenue in total_revenue:
-        total_revenue = revenue[0]
-        break
+    # The facility rows already partition the day, so the total needs no second query
+    total_revenue = sum(entry['daily_revenue'] for entry in result_list) if result_list else None
     return result_list, total_revenue
 
 # =====================================
 # Generate Revenue By Date and Patients
 # =====================================
-def generate_revenue_by_patient(session, date):
+def _fold_revenue_by_patient(rows):
+    """
+    Fold (facility_id, ftype, address, patient_id, revenue) rows, ordered by
+    facility_id, into the per-facility list and the overall total.
+    """
+    result_list = []
+    total_revenue = None
+    for facility_id, ftype, address, patient_id, revenue in rows:
+        if not result_list or result_list[-1]['facility_id'] != facility_id:
+            result_list.append({'facility_id': facility_id, 'ftype': ftype, 'address': address,
+                                'daily_revenue': 0, 'patients': []})
+        facility = result_list[-1]
+        facility['patients'].append({'patient_id': patient_id, 'total_revenue_per_patient': revenue})
+        facility['daily_revenue'] += revenue
+        total_revenue = revenue if total_revenue is None else total_revenue + revenue
+    return result_list, total_revenue
 
-    revenue_by_patients_query = text("""SELECT f.facility_id, f.address, a.patient_id,
-                            SUM(id.cost) AS total_revenue_per_patient
-                            FROM Facility AS f
-                            LEFT JOIN Appointments AS a ON f.facility_id = a.facility_id
-                            LEFT JOIN InvoiceDetails AS id ON a.patient_id = id.patient_id 
-                            AND a.facility_id = id.facility_id 
-                            AND a.doctor_id = id.doctor_id 
-                            AND DATE(a.date_time) = DATE(id.date_time)
-                            WHERE DATE(id.date_time) = :date
-                            GROUP BY f.facility_id, f.address, a.patient_id;
-                        """)
-    revenue_data = session.execute(revenue_by_patients_query, {'date': date})
-    result_dict = {}
-    for revenue_entry in revenue_data:
-        if not revenue_entry[0] in result_dict.keys():
-            result_dict[revenue_entry[0]] = []
-        result_dict[revenue_entry[0]].append({'patient_id':revenue_entry[2],
-                                            'total_revenue_per_patient':revenue_entry[3]})
 
-    revenue_query = text("""SELECT f.facility_id, f.ftype, f.address, SUM(id.cost) AS total_revenue_per_facility
-                            FROM Facility AS f
-                            LEFT JOIN Appointments AS a ON f.facility_id = a.facility_id
-                            LEFT JOIN InvoiceDetails AS id ON a.patient_id = id.patient_id 
-                            AND a.facility_id = id.facility_id 
-                            AND a.doctor_id = id.doctor_id 
-                            AND DATE(a.date_time) = DATE(id.date_time)
-                            WHERE DATE(id.date_time) = :date
-                            GROUP BY f.facility_id, f.address;
-                        """)
-    revenue_data = session.execute(revenue_query, {'date': date})
-    result_list = []
-    for revenue_entry in revenue_data:
-        result_list.append({
-                    'facility_id': revenue_entry[0],
-                    'ftype': revenue_entry[1],
-                    'address': revenue_entry[2],
-                    'daily_revenue': revenue_entry[3],
-                    'patients' : result_dict[revenue_entry[0]]
-                })
+@cached_report(day_span)
+def generate_revenue_by_patient(session, date):
+    """
+    Revenue per facility and patient for one day, with facility and overall
+    totals folded from the patient rows of a single query.
+    """
+    revenue_query = text("""
+            SELECT dr.facility_id, f.ftype, f.address, dr.patient_id, SUM(dr.revenue) AS total_revenue_per_patient
+            FROM DailyRevenue AS dr
+            JOIN Facility AS f ON dr.facility_id = f.facility_id
+            WHERE dr.date = :revenue_date
+            GROUP BY dr.facility_id, dr.patient_id
+            ORDER BY dr.facility_id, dr.patient_id;
+        """)
+    return _fold_revenue_by_patient(session.execute(revenue_query, {'revenue_date': revenue_day(date)}))
 
-    total_revenue_query = text("""SELECT SUM(total_revenue_per_facility) AS total_revenue_all_facilities
-                                FROM (SELECT f.facility_id, f.address, SUM(id.cost) AS total_revenue_per_facility
-                                FROM Facility AS f
-                                LEFT JOIN Appointments AS a ON f.facility_id = a.facility_id
-                                LEFT JOIN InvoiceDetails AS id ON a.patient_id = id.patient_id 
-                                AND a.facility_id = id.facility_id 
-                                AND a.doctor_id = id.doctor_id 
-                                AND DATE(a.date_time) = DATE(id.date_time)
-                                WHERE DATE(id.date_time) =  :date
-                                GROUP BY f.facility_id, f.address) AS subquery;
-                                """)
-    total_revenue = session.execute(total_revenue_query, {'date': date})
-    for revenue in total_revenue:
-        total_revenue = revenue[0]
-        break
-    return result_list, total_revenue
+
+@cached_report(range_span)
+def generate_revenue_by_patient_range(session, start_date, end_date):
+    """
+    generate_revenue_by_patient for every day in [start_date, end_date]
+    (inclusive) from one query. Returns {date: (result_list, total_revenue)}
+    for the days that have revenue rows.
+    """
+    revenue_query = text("""
+            SELECT dr.date, dr.facility_id, f.ftype, f.address, dr.patient_id, SUM(dr.revenue) AS total_revenue_per_patient
+            FROM DailyRevenue AS dr
+            JOIN Facility AS f ON dr.facility_id = f.facility_id
+            WHERE dr.date BETWEEN :start_date AND :end_date
+            GROUP BY dr.date, dr.facility_id, dr.patient_id
+            ORDER BY dr.date, dr.facility_id, dr.patient_id;
+        """)
+    revenue_data = session.execute(revenue_query, {'start_date': revenue_day(start_date),
+                                                   'end_date': revenue_day(end_date)})
+    revenue_by_day = {}
+    for revenue_date, rows in groupby(revenue_data, key=lambda row: row[0]):
+        revenue_by_day[revenue_date] = _fold_revenue_by_patient(row[1:] for row in rows)
+    return revenue_by_day
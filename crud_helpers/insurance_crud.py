@@ -7,6 +7,9 @@ from sqlalchemy.orm import Session
 
 from sqlalchemy.exc import SQLAlchemyError
 
+from crud_helpers.reference_cache import reference_cache, INSURANCE_COMPANIES
+from crud_helpers.report_cache import report_cache
+
 
 from app.schemas import EmployeeModel, JobClass, Doctor, Nurse, Admin, OtherHCP, OutpatientSurgery, Facility, Office, \
     InsuranceCompany
@@ -24,6 +27,7 @@ def create_insurance_company(session, insurance_data):
                             """)
         session.execute(insurance_insert, insurance_data)
         session.commit()
+        reference_cache.invalidate(INSURANCE_COMPANIES)
     except SQLAlchemyError as e:
         session.rollback()  # Roll back the transaction on error
         raise Exception(f"Database operation failed: {str(e)}")
@@ -123,6 +127,8 @@ def update_insurance_company_data(session, insurance_id, name, address):
         ic("is my log showing____________________", {'insurance_id': insurance_id, 'name': name, 'address': address})
         session.execute(update_stmt, {'insurance_id': insurance_id, 'name': name, 'address': address})
         session.commit()
+        reference_cache.invalidate(INSURANCE_COMPANIES)
+        report_cache.clear()
         return True
     except SQLAlchemyError as e:
         session.rollback()
@@ -137,6 +143,8 @@ def delete_insurance_company_entry(session, insurance_id):
         """)
         session.execute(insurance_delete_query, {'insurance_id': insurance_id})
         session.commit()
+        reference_cache.invalidate(INSURANCE_COMPANIES)
+        report_cache.clear()
         print("\n\nDeletion Progress is here\n\n", insurance_delete_query)
     except SQLAlchemyError as e:
         session.rollback()
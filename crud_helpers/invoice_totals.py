@@ -0,0 +1,131 @@
+from sqlalchemy import text, bindparam
+from sqlalchemy.exc import SQLAlchemyError
+
+
+def recompute_invoice_totals(session, invoice_ids):
+    """
+    Set total_cost = SUM(InvoiceDetails.cost) for the given invoices with one
+    grouped UPDATE, inside the caller's transaction.
+    """
+    session.execute(text("""
+        UPDATE Invoice i
+        LEFT JOIN (
+            SELECT invoice_id, SUM(cost) AS total
+            FROM InvoiceDetails
+            WHERE invoice_id IN :invoice_ids
+            GROUP BY invoice_id
+        ) totals ON i.invoice_id = totals.invoice_id
+        SET i.total_cost = COALESCE(totals.total, 0)
+        WHERE i.invoice_id IN :invoice_ids
+    """).bindparams(bindparam('invoice_ids', expanding=True)), {'invoice_ids': list(invoice_ids)})
+
+
+def flush_invoice_totals(session, batch_size=500):
+    """
+    Recompute Invoice.total_cost for the invoices in up to batch_size rows of
+    InvoiceTotalQueue (deferred invoice_totals_mode) and dequeue those rows,
+    in one short READ COMMITTED transaction.
+
+    The queue is append-only and read without locks, so flushing never
+    blocks a writer. queue_id is assigned at insert time, so a row can
+    become visible after rows with higher ids. Only the leading run of
+    consecutive visible ids is taken. An id still uncommitted is never
+    inside the range that is recomputed and deleted, and its invoice is
+    picked up by a later flush. Every queued invoice is flushed in queue
+    order, however busy it is.
+
+    session must not be inside a transaction: the isolation level is only
+    applied to the connection of a new one.
+
+    Returns the number of invoices recomputed.
+    """
+    try:
+        session.connection(execution_options={'isolation_level': 'READ COMMITTED'})
+        queue_ids = session.execute(text("""
+            SELECT queue_id FROM InvoiceTotalQueue
+            ORDER BY queue_id
+            LIMIT :batch_size
+        """), {'batch_size': batch_size}).scalars().all()
+        if not queue_ids:
+            session.rollback()
+            return 0
+
+        # End of the leading run of consecutive ids
+        last_id = queue_ids[0]
+        for queue_id in queue_ids[1:]:
+            if queue_id != last_id + 1:
+                break
+            last_id = queue_id
+        queue_range = {'first_id': queue_ids[0], 'last_id': last_id}
+
+        invoice_ids = session.execute(text("""
+            SELECT DISTINCT invoice_id FROM InvoiceTotalQueue
+            WHERE queue_id BETWEEN :first_id AND :last_id
+        """), queue_range).scalars().all()
+        recompute_invoice_totals(session, invoice_ids)
+        session.execute(text("""
+            DELETE FROM InvoiceTotalQueue WHERE queue_id BETWEEN :first_id AND :last_id
+        """), queue_range)
+        session.commit()
+        return len(invoice_ids)
+    except SQLAlchemyError as e:
+        session.rollback()
+        raise Exception(f"Failed to flush invoice totals: {str(e)}")
+
+
+def pending_invoice_totals(session):
+    return session.execute(text("SELECT COUNT(DISTINCT invoice_id) FROM InvoiceTotalQueue")).scalar()
+
+
+def reconcile_invoice_totals(session, after_id=0, chunk_size=1000, fix=False):
+    """
+    Walk Invoice in primary-key chunks of chunk_size, after invoice after_id,
+    and compare each total_cost with SUM(InvoiceDetails.cost).
+
+    Each chunk is checked with one grouped, non-locking read. InvoiceDetails
+    is keyed by invoice_id first, so this is a range scan. Invoices still
+    queued by the deferred totals mode are skipped. With fix=True, the
+    drifted invoices of a chunk are recomputed under row locks in that
+    chunk's own short transaction, so live writes are never blocked for
+    longer than one chunk.
+
+    Yields (last_invoice_id, drift) per chunk, where drift is a list of
+    (invoice_id, stored_total, actual_total). Pass last_invoice_id back as
+    after_id to resume.
+    """
+    while True:
+        last_id = session.execute(text("""
+            SELECT MAX(invoice_id) FROM (
+                SELECT invoice_id FROM Invoice
+                WHERE invoice_id > :after_id
+                ORDER BY invoice_id
+                LIMIT :chunk_size
+            ) AS chunk
+        """), {'after_id': after_id, 'chunk_size': chunk_size}).scalar()
+        if last_id is None:
+            session.rollback()
+            return
+
+        drift = [tuple(row) for row in session.execute(text("""
+            SELECT i.invoice_id, i.total_cost, COALESCE(totals.total, 0)
+            FROM Invoice i
+            LEFT JOIN (
+                SELECT invoice_id, SUM(cost) AS total
+                FROM InvoiceDetails
+                WHERE invoice_id > :after_id AND invoice_id <= :last_id
+                GROUP BY invoice_id
+            ) totals ON i.invoice_id = totals.invoice_id
+            WHERE i.invoice_id > :after_id AND i.invoice_id <= :last_id
+              AND NOT (i.total_cost <=> COALESCE(totals.total, 0))
+              AND i.invoice_id NOT IN (SELECT invoice_id FROM InvoiceTotalQueue)
+            ORDER BY i.invoice_id
+        """), {'after_id': after_id, 'last_id': last_id})]
+        try:
+            if fix and drift:
+                recompute_invoice_totals(session, [invoice_id for invoice_id, _, _ in drift])
+            session.commit()
+        except SQLAlchemyError as e:
+            session.rollback()
+            raise Exception(f"Failed to reconcile invoices {after_id + 1}-{last_id}: {str(e)}")
+        yield last_id, drift
+        after_id = last_id
@@ -7,6 +7,9 @@ from sqlalchemy.orm import Session
 
 from sqlalchemy.exc import SQLAlchemyError
 
+from crud_helpers.reference_cache import reference_cache, PATIENTS
+from crud_helpers.report_cache import report_cache
+
 
 from app.schemas import EmployeeModel, JobClass, Doctor, Nurse, Admin, OtherHCP, OutpatientSurgery, Facility, Office, \
     InsuranceCompany
@@ -23,6 +26,7 @@ def create_patient(session, patient_data):
         """)
         session.execute(insert_query, patient_data)
         session.commit()
+        reference_cache.invalidate(PATIENTS)
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Failed to add patient: {str(e)}")
@@ -75,6 +79,62 @@ def get_all_patients(session):
         raise Exception(f"Failed to retrieve all patients: {str(e)}")
 
 
+def escape_like(value):
+    return value.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def search_patients(session, query, limit=20):
+    """
+    Prefix-match patients on first or last name (or an exact patient_id when
+    the query is numeric). Both name columns are indexed, so each prefix is
+    an index range scan.
+    """
+    query = query.strip()
+    if not query:
+        return []
+    try:
+        if query.isdigit():
+            patient = get_patient(session, int(query))
+            return [patient] if patient else []
+        select_query = text("""
+            SELECT patient_id, fname, lname, primary_doc_id, insurance_id
+            FROM Patient
+            WHERE lname LIKE :prefix OR fname LIKE :prefix
+            ORDER BY lname, fname, patient_id
+            LIMIT :limit;
+        """)
+        result = session.execute(select_query, {'prefix': escape_like(query) + '%', 'limit': limit})
+        return [{'patient_id': row[0], 'fname': row[1], 'lname': row[2], 'primary_doc_id': row[3],
+                 'insurance_id': row[4]} for row in result]
+    except SQLAlchemyError as e:
+        raise Exception(f"Failed to search patients: {str(e)}")
+
+
+def list_patients(session, after_id=0, limit=100):
+    """
+    Return up to limit patients with patient_id greater than after_id, in id order.
+    """
+    try:
+        select_query = text("""
+            SELECT patient_id, fname, lname, primary_doc_id, insurance_id
+            FROM Patient
+            WHERE patient_id > :after_id
+            ORDER BY patient_id
+            LIMIT :limit;
+        """)
+        result = session.execute(select_query, {'after_id': after_id, 'limit': limit})
+        return [{'patient_id': row[0], 'fname': row[1], 'lname': row[2], 'primary_doc_id': row[3],
+                 'insurance_id': row[4]} for row in result]
+    except SQLAlchemyError as e:
+        raise Exception(f"Failed to list patients: {str(e)}")
+
+
+def patient_exists(session, patient_id):
+    result = session.execute(text("SELECT 1 FROM Patient WHERE patient_id = :patient_id"),
+                             {'patient_id': patient_id})
+    return result.first() is not None
+
+
 # =========================
 # CRUD operations for Update
 # =========================
@@ -87,6 +147,8 @@ def update_patient(session, patient_id, update_data):
         """)
         session.execute(update_query, {**update_data, 'patient_id': patient_id})
         session.commit()
+        reference_cache.invalidate(PATIENTS)
+        report_cache.clear()
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Failed to update patient: {str(e)}")
@@ -102,6 +164,8 @@ def delete_patient(session, patient_id):
         """)
         session.execute(delete_query, {'patient_id': patient_id})
         session.commit()
+        reference_cache.invalidate(PATIENTS)
+        report_cache.clear()
     except SQLAlchemyError as e:
         session.rollback()
         raise Exception(f"Failed to delete patient: {str(e)}")
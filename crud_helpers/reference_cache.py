@@ -0,0 +1,33 @@
+from app.settings import settings
+from crud_helpers.ttl_cache import TTLCache
+
+# Entity types; each is invalidated by the crud_helpers functions that write it
+PATIENTS = 'patients'
+DOCTORS = 'doctors'
+FACILITIES = 'facilities'
+INSURANCE_COMPANIES = 'insurance_companies'
+
+
+class ReferenceDataCache:
+    """
+    In-process cache for the reference lists behind form dropdowns, keyed by
+    (entity, key). invalidate() drops every list of one entity type.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self._cache = TTLCache(max_entries, ttl)
+
+    def get(self, entity, loader, session, key=None):
+        """
+        Return loader(session) for the entity, from the cache when the entry is current.
+        """
+        return self._cache.get((entity, key), lambda: loader(session))
+
+    def invalidate(self, entity):
+        self._cache.invalidate(lambda cache_key: cache_key[0] == entity)
+
+    def clear(self):
+        self._cache.clear()
+
+
+reference_cache = ReferenceDataCache(settings.reference_cache_max_entries, settings.reference_cache_ttl)
@@ -0,0 +1,95 @@
+import functools
+import inspect
+from datetime import date, datetime, timedelta
+
+from app.settings import settings
+from app.utils.common import month_bounds
+from crud_helpers.ttl_cache import TTLCache
+
+
+def _as_date(value):
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    return datetime.fromisoformat(str(value)).date()
+
+
+class ReportCache:
+    """
+    In-process cache for report results, keyed by (report, parameters).
+
+    Every entry records the span of invoice dates it was computed from.
+    Writes call invalidate_dates() after committing, which drops only the
+    entries whose span covers a written date. Reports over past days are
+    kept for history_ttl, and reports that include today for ttl.
+    """
+
+    def __init__(self, max_entries, ttl, history_ttl):
+        self.history_ttl = history_ttl
+        self._cache = TTLCache(max_entries, ttl)
+
+    def get(self, report, params, first_date, last_date, loader):
+        """
+        Return loader() for the report, from the cache when the entry is current.
+        first_date and last_date bound the invoice dates the result depends on.
+        """
+        ttl = self.history_ttl if last_date < date.today() else None
+        return self._cache.get((report, params, first_date, last_date), loader, ttl)
+
+    def invalidate_dates(self, dates):
+        """
+        Drop every entry whose date span covers one of dates (dates,
+        datetimes or ISO strings).
+        """
+        dates = {_as_date(value) for value in dates}
+        if dates:
+            self._cache.invalidate(lambda cache_key: any(cache_key[2] <= day <= cache_key[3] for day in dates))
+
+    def clear(self):
+        self._cache.clear()
+
+
+report_cache = ReportCache(settings.report_cache_max_entries, settings.report_cache_ttl,
+                           settings.report_cache_history_ttl)
+
+
+def cached_report(span):
+    """
+    Serve a report function(session, ...) through report_cache. Arguments
+    may be passed by position or keyword. They are bound to the report's
+    signature with defaults applied, and the cache key is built from the
+    bound arguments. span(*bound arguments after session) returns the
+    (first_date, last_date) of the invoice dates the report reads. The
+    undecorated function stays available as .uncached.
+    """
+    def decorator(report):
+        signature = inspect.signature(report)
+
+        @functools.wraps(report)
+        def wrapper(session, *args, **kwargs):
+            bound = signature.bind(session, *args, **kwargs)
+            bound.apply_defaults()
+            arguments = list(bound.arguments.items())[1:]
+            first_date, last_date = span(*(value for _, value in arguments))
+            return report_cache.get(report.__name__, tuple((name, str(value)) for name, value in arguments),
+                                    first_date, last_date, lambda: report(*bound.args, **bound.kwargs))
+        wrapper.uncached = report
+        return wrapper
+    return decorator
+
+
+def day_span(day, *_):
+    # Further report parameters (e.g. an insurer) narrow the result, not the dates it reads
+    day = _as_date(day)
+    return day, day
+
+
+def month_span(year, month):
+    month_start, month_end = month_bounds(year, month)
+    return month_start, month_end - timedelta(days=1)
+
+
+def range_span(begin_date, end_date, *_):
+    # Further report parameters (e.g. k or group_by) do not change the dates read
+    return _as_date(begin_date), _as_date(end_date)
@@ -0,0 +1,98 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Thread-safe in-process LRU cache whose entries expire after a TTL.
+
+    Writers call invalidate() or update() after committing; both bump a
+    generation counter. A load runs outside the lock and is only stored if
+    the generation is unchanged, so a result read before a concurrent write
+    is never cached after it. The TTL bounds staleness for writes made by
+    other worker processes, and least recently used entries are evicted
+    beyond max_entries. Cached values are shared between requests and must
+    not be mutated.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._generation = 0
+        self._lock = threading.Lock()
+
+    def lookup(self, keys):
+        """
+        Return ({key: value} for the current entries among keys, missing keys,
+        generation). Pass the generation to store() with the loaded values.
+        """
+        found, missing = {}, []
+        now = time.monotonic()
+        with self._lock:
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None and entry[0] > now:
+                    self._entries.move_to_end(key)
+                    found[key] = entry[1]
+                else:
+                    missing.append(key)
+            self.hits += len(found)
+            self.misses += len(missing)
+            return found, missing, self._generation
+
+    def store(self, values, generation, ttl=None):
+        """
+        Cache {key: value} for ttl seconds (default self.ttl), unless a write
+        happened since generation was taken.
+        """
+        with self._lock:
+            if self._generation != generation:
+                return
+            expires = time.monotonic() + (self.ttl if ttl is None else ttl)
+            for key, value in values.items():
+                self._entries[key] = (expires, value)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key, loader, ttl=None):
+        """
+        Return the cached value for key, or loader() stored for ttl seconds.
+        """
+        found, _, generation = self.lookup([key])
+        if key in found:
+            return found[key]
+        value = loader()
+        self.store({key: value}, generation, ttl)
+        return value
+
+    def invalidate(self, match=None):
+        """
+        Drop the entries whose key satisfies match(key), or all entries.
+        """
+        with self._lock:
+            self._generation += 1
+            if match is None:
+                self._entries.clear()
+                return
+            for key in [key for key in self._entries if match(key)]:
+                del self._entries[key]
+
+    def update(self, keys, apply):
+        """
+        Replace the value of each cached key among keys with apply(value).
+        Keys not cached are left to load fresh on next use.
+        """
+        with self._lock:
+            self._generation += 1
+            for key in keys:
+                entry = self._entries.get(key)
+                if entry is not None:
+                    self._entries[key] = (entry[0], apply(entry[1]))
+
+    def clear(self):
+        self.invalidate()
@@ -5,7 +5,7 @@ from sqlalchemy import text
 from sqlalchemy.exc import SQLAlchemyError
 import random
 from app.Database import db
-from crud_helpers.appointment_crud import create_appointment, search_appointments_db, update_appointment_cost_db, update_total_cost
+from crud_helpers.appointment_crud import create_appointments_bulk, search_appointments_db, update_appointment_costs_bulk, update_total_cost
 from crud_helpers.employee_crud import create_employee, get_all_doctors
 
 from crud_helpers.facility_crud import create_facility, retrieve_facilities
@@ -145,16 +145,22 @@ def populate_appointments():
         if not patients or not doctors or not facilities:
             raise Exception("Missing entities required to create appointments.")
 
-        # Generate data for 20 appointments
+        # Generate data for 50 appointments
+        rows = []
         for _ in range(50):
             patient = random.choice(patients)
             doctor = random.choice(doctors)
             facility = random.choice(facilities)
-            date_time = datetime.now() - timedelta(days=random.randint(1, 30))
-            description = fake.sentence()
+            rows.append({
+                'patient_id': patient['patient_id'],
+                'facility_id': facility['facility_id'],
+                'doctor_id': doctor['EMPID'],
+                'date_time': datetime.now() - timedelta(days=random.randint(1, 30)),
+                'description': fake.sentence()
+            })
 
-            create_appointment(session, patient['patient_id'], facility['facility_id'], doctor['EMPID'], date_time, description)
-            print(f"Created appointment for patient {patient['fname']} {patient['lname']} at {date_time}")
+        created, rejected = create_appointments_bulk(session, rows)
+        print(f"Created {created} appointments ({len(rejected)} skipped)")
 
     except Exception as e:
         print(f"An error occurred: {e}")
@@ -165,9 +171,8 @@ def update_all_appointments_costs():
     session = db.get_db()
     try:
         appointments = search_appointments_db(session)
-        for appointment in appointments:
-            new_cost = random.randint(100, 500)  # Example of new cost generation
-            update_appointment_cost_db(session, appointment['patient_id'], appointment['facility_id'], appointment['doctor_id'], appointment['date_time'], new_cost)
+        updates = [{**appointment, 'cost': random.randint(100, 500)} for appointment in appointments]
+        update_appointment_costs_bulk(session, updates)
 
     except Exception as e:
         print(f"An error occurred while updating appointment costs: {str(e)}")
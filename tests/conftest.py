@@ -0,0 +1,3 @@
+# Import the app package first, as run.py does: crud_helpers modules import app.settings,
+# and app/__init__.py imports the views, which import crud_helpers back.
+import app  # noqa: F401
@@ -0,0 +1,65 @@
+class StubResult:
+    """
+    The parts of a SQLAlchemy Result the crud helpers use, over fixed rows.
+    """
+
+    def __init__(self, rows=(), rowcount=None, lastrowid=None):
+        self.rows = [tuple(row) for row in rows]
+        self.rowcount = len(self.rows) if rowcount is None else rowcount
+        self.lastrowid = lastrowid
+
+    def __iter__(self):
+        return iter(self.rows)
+
+    def first(self):
+        return self.rows[0] if self.rows else None
+
+    def all(self):
+        return list(self.rows)
+
+    def scalar(self):
+        return self.rows[0][0] if self.rows else None
+
+    def scalars(self):
+        return StubResult([(row[0],) for row in self.rows])
+
+    def yield_per(self, count):
+        return self
+
+    def close(self):
+        pass
+
+
+class ScriptedSession:
+    """
+    Records every statement and answers it with the result of the first
+    (SQL fragment, result) pair whose fragment occurs in the statement.
+    Whitespace is collapsed before matching. A result may be a callable
+    taking the bound parameters. Unmatched statements get an empty result.
+    """
+
+    def __init__(self, responses=()):
+        self.responses = list(responses)
+        self.executed = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def execute(self, statement, params=None, **kwargs):
+        sql = ' '.join(str(statement).split())
+        self.executed.append((sql, params))
+        for fragment, result in self.responses:
+            if fragment in sql:
+                return result(params) if callable(result) else result
+        return StubResult()
+
+    def params_of(self, fragment):
+        return [params for sql, params in self.executed if fragment in sql]
+
+    def connection(self, **kwargs):
+        return self
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
@@ -0,0 +1,98 @@
+from datetime import datetime
+
+import pytest
+
+from crud_helpers.appointment_crud import reschedule_appointment, get_appointment_by_id, create_appointments_bulk
+from tests.stubs import ScriptedSession, StubResult
+
+ORIGINAL = {'patient_id': 1, 'facility_id': 2, 'doctor_id': 3, 'date_time': datetime(2024, 5, 6, 9, 0),
+            'description': 'Checkup'}
+LOCK_ORIGINAL = 'FROM Appointments WHERE patient_id = :patient_id'
+INVOICE_WRITES = ('INSERT INTO Invoice ', 'UPDATE InvoiceDetails')
+
+
+def written(session, fragments):
+    return [sql for sql, _ in session.executed if any(fragment in sql for fragment in fragments)]
+
+
+def test_reschedule_failed_update_writes_no_invoice():
+    session = ScriptedSession([
+        (LOCK_ORIGINAL, StubResult([(1,)])),
+        ('UPDATE Appointments', StubResult(rowcount=0)),
+        ('FROM Patient p JOIN Invoice i', StubResult()),
+        ('INSERT INTO Invoice ', StubResult(rowcount=1, lastrowid=99)),
+    ])
+    updated = dict(ORIGINAL, patient_id=4)
+
+    with pytest.raises(ValueError):
+        reschedule_appointment(session, ORIGINAL, updated)
+    assert written(session, INVOICE_WRITES) == []
+    assert session.commits == 0
+    assert session.rollbacks == 1
+
+
+def test_reschedule_missing_original_writes_nothing():
+    session = ScriptedSession([(LOCK_ORIGINAL, StubResult())])
+
+    with pytest.raises(ValueError):
+        reschedule_appointment(session, ORIGINAL, dict(ORIGINAL, patient_id=4))
+    assert [sql for sql, _ in session.executed if not sql.startswith('SELECT')] == []
+    assert session.commits == 0
+
+
+def test_reschedule_to_new_patient_moves_detail_after_update():
+    session = ScriptedSession([
+        (LOCK_ORIGINAL, StubResult([(1,)])),
+        ('UPDATE Appointments', StubResult(rowcount=1)),
+        ('FROM Patient p JOIN Invoice i', StubResult([(7,)])),
+    ])
+
+    reschedule_appointment(session, ORIGINAL, dict(ORIGINAL, patient_id=4))
+    statements = [sql for sql, _ in session.executed]
+    update_index = next(index for index, sql in enumerate(statements) if 'UPDATE Appointments' in sql)
+    move_index = next(index for index, sql in enumerate(statements) if 'UPDATE InvoiceDetails' in sql)
+    assert update_index < move_index
+    assert session.params_of('UPDATE InvoiceDetails')[0]['invoice_id'] == 7
+    assert session.commits == 1
+
+
+def test_loaded_appointment_round_trips_through_reschedule():
+    row = (ORIGINAL['patient_id'], ORIGINAL['facility_id'], ORIGINAL['doctor_id'], ORIGINAL['date_time'],
+           ORIGINAL['description'])
+    session = ScriptedSession([
+        ('SELECT patient_id, facility_id, doctor_id, date_time, description FROM Appointments', StubResult([row])),
+        (LOCK_ORIGINAL, StubResult([(1,)])),
+        ('UPDATE Appointments', StubResult(rowcount=1)),
+    ])
+    appointment = get_appointment_by_id(session, 1, 2, 3, ORIGINAL['date_time'])
+    assert appointment == ORIGINAL
+
+    reschedule_appointment(session, appointment, dict(appointment, description='Follow-up'))
+    update = session.params_of('UPDATE Appointments')[0]
+    assert (update['original_patient_id'], update['original_facility_id'], update['original_doctor_id'],
+            update['original_date_time']) == (1, 2, 3, ORIGINAL['date_time'])
+    assert update['description'] == 'Follow-up'
+    assert session.commits == 1
+
+
+BULK_ROW = {'patient_id': 1, 'facility_id': 2, 'doctor_id': 3, 'date_time': datetime(2024, 5, 6, 9, 0),
+            'description': 'Imported'}
+
+
+def test_bulk_create_reads_invoices_back_with_a_locking_read():
+    session = ScriptedSession([
+        ('SELECT patient_id, insurance_id FROM Patient', StubResult([(1, 5)])),
+        ('SELECT invoice_id, insurance_id, date FROM Invoice', StubResult([(9, 5, BULK_ROW['date_time'].date())])),
+    ])
+    assert create_appointments_bulk(session, [BULK_ROW]) == (1, [])
+    readback = next(sql for sql, _ in session.executed if 'SELECT invoice_id, insurance_id, date FROM Invoice' in sql)
+    assert readback.endswith('FOR SHARE')
+    assert session.params_of('INSERT INTO InvoiceDetails')[0][0]['invoice_id'] == 9
+
+
+def test_bulk_create_rolls_back_when_an_invoice_is_missing():
+    session = ScriptedSession([('SELECT patient_id, insurance_id FROM Patient', StubResult([(1, 5)]))])
+    with pytest.raises(KeyError):
+        create_appointments_bulk(session, [BULK_ROW])
+    assert session.commits == 0
+    assert session.rollbacks == 1
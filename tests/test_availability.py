@@ -0,0 +1,102 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from crud_helpers.appointment_crud import reschedule_appointment
+from crud_helpers.availability import availability_cache, merge_busy, find_free_slots
+from tests.stubs import ScriptedSession, StubResult
+
+HALF_HOUR = timedelta(minutes=30)
+DAY = datetime(2024, 5, 6)
+SCHEDULE_QUERY = 'SELECT date_time FROM Appointments WHERE doctor_id = :owner_id'
+CONFLICT_QUERY = 'SELECT date_time FROM Appointments WHERE doctor_id = :doctor_id'
+
+
+def at(hour, minute=0, days=0):
+    return DAY + timedelta(days=days, hours=hour, minutes=minute)
+
+
+@pytest.fixture(autouse=True)
+def empty_availability_cache():
+    availability_cache.clear()
+    yield
+    availability_cache.clear()
+
+
+def schedule(*starts):
+    return ScriptedSession([(SCHEDULE_QUERY, StubResult([(start,) for start in starts]))])
+
+
+def test_merge_busy_overlapping_and_adjacent():
+    assert merge_busy([at(9), at(9, 15)], HALF_HOUR) == [(at(9), at(9, 45))]
+    assert merge_busy([at(9), at(9, 30)], HALF_HOUR) == [(at(9), at(10))]
+    assert merge_busy([at(9), at(10)], HALF_HOUR) == [(at(9), at(9, 30)), (at(10), at(10, 30))]
+    assert merge_busy([], HALF_HOUR) == []
+
+
+def test_free_slots_skip_bookings_from_opening():
+    slots = find_free_slots(schedule(at(8)), 'doctor', 1, at(7), count=3)
+    assert slots == [(at(8, 30), at(9)), (at(9), at(9, 30)), (at(9, 30), at(10))]
+
+
+def test_free_slots_fill_gap_between_bookings_exactly():
+    slots = find_free_slots(schedule(at(8), at(9)), 'doctor', 1, at(8), count=2)
+    assert slots == [(at(8, 30), at(9)), (at(9, 30), at(10))]
+
+
+def test_free_slots_end_at_closing_and_continue_next_day():
+    slots = find_free_slots(schedule(), 'doctor', 1, at(16, 30), count=2)
+    assert slots == [(at(16, 30), at(17)), (at(8, days=1), at(8, 30, days=1))]
+
+
+def test_free_slots_skip_booking_at_closing_edge():
+    slots = find_free_slots(schedule(at(16, 30)), 'doctor', 1, at(16), count=2)
+    assert slots == [(at(16), at(16, 30)), (at(8, days=1), at(8, 30, days=1))]
+
+
+def test_free_slots_round_start_up_to_the_minute():
+    slots = find_free_slots(schedule(), 'doctor', 1, at(9, 0) + timedelta(seconds=5), count=1)
+    assert slots == [(at(9, 1), at(9, 31))]
+
+
+def test_free_slots_stop_at_horizon():
+    busy_days = [at(hour, minute, days) for days in range(2) for hour in range(8, 17) for minute in (0, 30)]
+    assert find_free_slots(schedule(*busy_days), 'doctor', 1, at(8), count=1, horizon_days=2) == []
+
+
+ORIGINAL = {'patient_id': 1, 'facility_id': 2, 'doctor_id': 3, 'date_time': at(9), 'description': 'Checkup'}
+
+
+def booked_at_own_slot(params):
+    # The appointment's own slot conflicts unless the check ignores it
+    if params['ignore_date_time'] == ORIGINAL['date_time']:
+        return StubResult()
+    return StubResult([(ORIGINAL['date_time'],)])
+
+
+def reschedule_session():
+    return ScriptedSession([
+        ('FROM Appointments WHERE patient_id = :patient_id', StubResult([(1,)])),
+        (CONFLICT_QUERY, booked_at_own_slot),
+        ('UPDATE Appointments', StubResult(rowcount=1)),
+    ])
+
+
+def test_description_only_edit_does_not_conflict_with_itself():
+    session = reschedule_session()
+    reschedule_appointment(session, ORIGINAL, dict(ORIGINAL, description='Follow-up'))
+    assert session.commits == 1
+
+
+def test_same_doctor_move_ignores_its_own_slot():
+    session = reschedule_session()
+    reschedule_appointment(session, ORIGINAL, dict(ORIGINAL, date_time=at(9, 15)))
+    assert session.params_of(CONFLICT_QUERY)[0]['ignore_date_time'] == ORIGINAL['date_time']
+    assert session.commits == 1
+
+
+def test_move_to_another_doctor_checks_the_whole_window():
+    session = reschedule_session()
+    with pytest.raises(ValueError):
+        reschedule_appointment(session, ORIGINAL, dict(ORIGINAL, doctor_id=4))
+    assert session.commits == 0
@@ -0,0 +1,68 @@
+from datetime import date
+
+import pytest
+from flask import Flask
+
+from app import routes
+from app.views import appointment_management
+from crud_helpers.daily_revenue import generate_top_revenue_days_window, generate_revenue_series
+from crud_helpers.report_cache import report_cache
+
+
+class StubSession:
+    """
+    Returns the given rows for every query, like a Result iterated as tuples.
+    """
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.queries = 0
+
+    def execute(self, statement, params=None, **kwargs):
+        self.queries += 1
+        return iter(self.rows)
+
+
+@pytest.fixture(autouse=True)
+def empty_report_cache():
+    report_cache.clear()
+    yield
+    report_cache.clear()
+
+
+def test_top_revenue_days_window_with_k():
+    session = StubSession([(date(2024, 1, 1), 10), (date(2024, 1, 2), 30), (date(2024, 1, 3), 20)])
+    top_days = generate_top_revenue_days_window(session, date(2024, 1, 1), date(2024, 1, 31), 2)
+    assert top_days == [{'revenue_date': date(2024, 1, 2), 'total_revenue': 30},
+                        {'revenue_date': date(2024, 1, 3), 'total_revenue': 20}]
+
+
+def test_top_revenue_days_window_with_group_by_is_cached():
+    session = StubSession([(1, date(2024, 1, 1), 10), (1, date(2024, 1, 2), 30), (2, date(2024, 1, 1), 5)])
+    args = (date(2024, 1, 1), date(2024, 1, 31), 1, 'facility')
+    top_days = generate_top_revenue_days_window(session, *args)
+    assert top_days == {1: [{'revenue_date': date(2024, 1, 2), 'total_revenue': 30}],
+                        2: [{'revenue_date': date(2024, 1, 1), 'total_revenue': 5}]}
+    assert generate_top_revenue_days_window(session, *args) is top_days
+    assert session.queries == 1
+
+
+def test_revenue_series_zero_fills_days():
+    session = StubSession([(date(2024, 1, 2), 7, 12.5), (date(2024, 1, 3), 3, 2)])
+    revenue_series = generate_revenue_series(session, date(2024, 1, 1), date(2024, 1, 3), 'facility')
+    assert revenue_series == {'dates': ['2024-01-01', '2024-01-02', '2024-01-03'],
+                              'series': {3: [0.0, 0.0, 2.0], 7: [0.0, 12.5, 0.0]},
+                              'total': [0.0, 12.5, 2.0]}
+
+
+def test_revenue_series_api(monkeypatch):
+    session = StubSession([(date(2024, 1, 2), 1, 4)])
+    monkeypatch.setattr(appointment_management.db, 'get_db', lambda: session)
+    app = Flask('app')
+    app.register_blueprint(routes.bp)
+
+    response = app.test_client().get('/api/revenue/series?start=2024-01-01&end=2024-01-02&group_by=insurer')
+    assert response.status_code == 200
+    assert response.get_json() == {'start': '2024-01-01', 'end': '2024-01-02', 'group_by': 'insurer',
+                                   'dates': ['2024-01-01', '2024-01-02'], 'series': {'1': [0.0, 4.0]},
+                                   'total': [0.0, 4.0]}
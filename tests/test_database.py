@@ -0,0 +1,43 @@
+import pytest
+from flask import Flask
+from sqlalchemy import text
+
+from app import routes
+from app.Database import db
+from app.settings import settings
+
+
+@pytest.fixture
+def sqlite_app(monkeypatch):
+    monkeypatch.setattr(settings, 'database_url', 'sqlite://')
+    db.disconnect()
+    app = Flask('app')
+    app.register_blueprint(routes.bp)
+    yield app
+    db.disconnect()
+
+
+def test_request_uses_one_checkout(sqlite_app):
+    def probe():
+        # Several helpers sharing the request's session
+        db.get_db().execute(text("SELECT 1"))
+        db.get_db().execute(text("SELECT 2"))
+        return 'ok'
+    sqlite_app.add_url_rule('/probe', view_func=probe)
+
+    assert sqlite_app.test_client().get('/probe').status_code == 200
+    assert db.checkout_count == 1
+
+
+def test_commit_mid_request_checks_out_again(sqlite_app):
+    # Helpers that commit end the session's transaction and return its connection,
+    # so the next statement in the same request checks one out again
+    def probe():
+        db.get_db().execute(text("SELECT 1"))
+        db.get_db().commit()
+        db.get_db().execute(text("SELECT 2"))
+        return 'ok'
+    sqlite_app.add_url_rule('/probe', view_func=probe)
+
+    assert sqlite_app.test_client().get('/probe').status_code == 200
+    assert db.checkout_count == 2
@@ -0,0 +1,26 @@
+from contextlib import nullcontext
+
+import pytest
+
+import app.migrations as migrations
+from tests.stubs import ScriptedSession, StubResult
+
+
+class StubEngine:
+    def connect(self):
+        return nullcontext(None)
+
+
+@pytest.mark.parametrize('lock_result', [0, None])
+def test_run_migrations_stops_without_the_lock(monkeypatch, lock_result):
+    session = ScriptedSession([
+        ('SELECT MAX(version) FROM schema_version', StubResult([(0,)])),
+        ('GET_LOCK', StubResult([(lock_result,)])),
+    ])
+    session.close = lambda: None
+    monkeypatch.setattr(migrations, 'Session', lambda bind: session)
+
+    with pytest.raises(RuntimeError):
+        migrations.run_migrations(StubEngine())
+    statements = [sql for sql, _ in session.executed]
+    assert not any('schema_version (' in sql or 'RELEASE_LOCK' in sql for sql in statements)
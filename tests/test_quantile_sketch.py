@@ -0,0 +1,86 @@
+import random
+import statistics
+
+import pytest
+
+from app.utils.quantile_sketch import QuantileSketch
+
+
+def lognormal_sample(size, seed=7):
+    generator = random.Random(seed)
+    return [generator.lognormvariate(5, 1) for _ in range(size)]
+
+
+@pytest.mark.parametrize('accuracy', [0.01, 0.05])
+def test_quantiles_within_relative_accuracy(accuracy):
+    # 10001 values and eighths: every cut point falls exactly on a sample value
+    values = lognormal_sample(10001)
+    sketch = QuantileSketch(accuracy)
+    for value in values:
+        sketch.add(value)
+
+    expected = statistics.quantiles(values, n=8, method='inclusive')
+    for index, true_value in enumerate(expected, start=1):
+        estimate = sketch.quantile(index / 8)
+        assert abs(estimate - true_value) <= accuracy * true_value
+    assert sketch.quantile(0) == min(values)
+    assert sketch.quantile(1) == max(values)
+    assert sketch.count == len(values)
+    assert sketch.mean == pytest.approx(statistics.fmean(values))
+
+
+def test_merge_matches_single_sketch():
+    values = lognormal_sample(2000)
+    whole, first, second = QuantileSketch(), QuantileSketch(), QuantileSketch()
+    for value in values:
+        whole.add(value)
+    for value in values[:700]:
+        first.add(value)
+    for value in values[700:]:
+        second.add(value)
+
+    assert first.merge(second) is first
+    assert first.bins == whole.bins
+    assert (first.count, first.min, first.max) == (whole.count, whole.min, whole.max)
+    assert first.sum == pytest.approx(whole.sum)
+    for q in (0, 0.1, 0.5, 0.9, 0.99, 1):
+        assert first.quantile(q) == whole.quantile(q)
+    assert second.count == 1300
+
+
+def test_merge_with_empty_sketch():
+    sketch = QuantileSketch()
+    sketch.add(10, count=3)
+    sketch.merge(QuantileSketch())
+    assert (sketch.count, sketch.min, sketch.max) == (3, 10.0, 10.0)
+
+    empty = QuantileSketch().merge(sketch)
+    assert (empty.count, empty.min, empty.max) == (3, 10.0, 10.0)
+    assert empty.quantile(0.5) == 10.0
+
+
+def test_merge_rejects_other_accuracy():
+    with pytest.raises(ValueError):
+        QuantileSketch(0.01).merge(QuantileSketch(0.02))
+
+
+def test_empty_sketch():
+    sketch = QuantileSketch()
+    assert sketch.quantile(0.5) is None
+    assert sketch.mean is None
+    assert sketch.count == 0
+
+
+def test_zero_and_negative_values_report_zero():
+    sketch = QuantileSketch()
+    sketch.add(0, count=3)
+    sketch.add(-5)
+    assert sketch.zero_count == 4
+    assert sketch.quantile(0.5) == 0.0
+    assert sketch.quantile(1) == 0.0
+
+    sketch.add(100, count=4)
+    assert sketch.quantile(0.25) == 0.0
+    assert sketch.quantile(0.75) == pytest.approx(100, rel=0.01)
+    assert sketch.quantile(1) == 100.0
+    assert sketch.min == -5.0
@@ -0,0 +1,36 @@
+from datetime import date
+
+from crud_helpers.report_cache import cached_report, range_span, report_cache
+
+
+def test_cached_report_binds_keywords_and_defaults():
+    calls = []
+
+    @cached_report(range_span)
+    def report(session, start_date, end_date, k=5):
+        calls.append(k)
+        return [k]
+
+    report_cache.clear()
+    assert report(None, date(2024, 1, 1), date(2024, 1, 2)) == [5]
+    assert report(None, date(2024, 1, 1), end_date=date(2024, 1, 2), k=5) == [5]
+    assert report(None, date(2024, 1, 1), date(2024, 1, 2), k=3) == [3]
+    assert calls == [5, 3]
+    report_cache.clear()
+
+
+def test_cached_report_invalidates_covered_dates():
+    calls = []
+
+    @cached_report(range_span)
+    def report(session, start_date, end_date):
+        calls.append(start_date)
+        return len(calls)
+
+    report_cache.clear()
+    assert report(None, date(2024, 1, 1), date(2024, 1, 31)) == 1
+    report_cache.invalidate_dates(['2024-02-01'])
+    assert report(None, date(2024, 1, 1), date(2024, 1, 31)) == 1
+    report_cache.invalidate_dates([date(2024, 1, 15)])
+    assert report(None, date(2024, 1, 1), date(2024, 1, 31)) == 2
+    report_cache.clear()
@@ -0,0 +1,49 @@
+from crud_helpers.ttl_cache import TTLCache
+
+
+def test_get_loads_once_until_invalidated():
+    cache = TTLCache(max_entries=8, ttl=60)
+    calls = []
+
+    def loader():
+        calls.append(1)
+        return len(calls)
+
+    assert cache.get('a', loader) == 1
+    assert cache.get('a', loader) == 1
+    cache.invalidate(lambda key: key == 'a')
+    assert cache.get('a', loader) == 2
+    assert (cache.hits, cache.misses) == (1, 2)
+
+
+def test_load_racing_a_write_is_not_stored():
+    cache = TTLCache(max_entries=8, ttl=60)
+
+    def loader():
+        cache.invalidate(lambda key: False)
+        return 'stale'
+
+    assert cache.get('a', loader) == 'stale'
+    assert cache.lookup(['a'])[1] == ['a']
+
+
+def test_expired_and_evicted_entries_reload():
+    cache = TTLCache(max_entries=2, ttl=60)
+    cache.get('old', lambda: 0, ttl=-1)
+    assert cache.lookup(['old'])[1] == ['old']
+
+    for key in ('a', 'b', 'c'):
+        cache.get(key, lambda: key)
+    cache.get('b', lambda: 'b')
+    found, missing, _ = cache.lookup(['a', 'b', 'c'])
+    assert found == {'b': 'b', 'c': 'c'}
+    assert missing == ['a']
+
+
+def test_update_touches_only_cached_keys():
+    cache = TTLCache(max_entries=8, ttl=60)
+    cache.get('a', lambda: (1,))
+    cache.update(['a', 'b'], lambda value: value + (2,))
+    found, missing, _ = cache.lookup(['a', 'b'])
+    assert found == {'a': (1, 2)}
+    assert missing == ['b']